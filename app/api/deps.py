@@ -1,9 +1,16 @@
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from fastapi import Request
+from starlette.requests import HTTPConnection
+from app.services.live import PriceHub
 from app.services.price_service import PriceService
-from fastapi import Depends
 
 
-def get_price_service() -> PriceService:
-    """Dependency to get price service"""
-    return PriceService()
+def get_price_service(request: Request) -> PriceService:
+    """Dependency to get the application-wide price service"""
+    price_service: PriceService = request.app.state.price_service
+    return price_service
+
+
+def get_price_hub(connection: HTTPConnection) -> PriceHub:
+    """Dependency to get the application-wide live price hub (HTTP or WebSocket)"""
+    price_hub: PriceHub = connection.app.state.price_hub
+    return price_hub
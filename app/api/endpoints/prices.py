@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import Optional, List
+import asyncio
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing import AsyncIterator, List, Optional
 
-from app.api.deps import get_price_service
-from app.core.database import get_db
-from app.schemas.price import PriceResponse, MovingAverageResponse
+from app.api.deps import get_price_hub, get_price_service
+from app.core.database import get_async_db, get_async_sessionmaker
+from app.schemas.price import PriceResponse, MovingAverageResponse, BatchPriceResponse, PriceHistoryResponse
+from app.core.config import settings
 from app.schemas.job import PollRequest, PollResponse
 
 from app.services.price_service import PriceService
+from app.services.live import PriceHub
+from app.services.export import MEDIA_TYPES, export_query, get_encoder, stream_export
+from app.services.market_data import CircuitOpenError, RateLimitExceeded
+from app.services.singleflight import SingleFlightOverloaded
 
 router = APIRouter()
 
@@ -16,23 +25,73 @@ router = APIRouter()
 async def get_latest_price(
     symbol: str = Query(..., description="Stock symbol (e.g., AAPL)"),
     provider: Optional[str] = Query(None, description="Data provider"),
-    db: Session = Depends(get_db),
+    max_age: Optional[float] = Query(None, ge=0, description="Accept a cached price up to this many seconds old"),
+    db: AsyncSession = Depends(get_async_db),
     price_service: PriceService = Depends(get_price_service),
-):
+) -> PriceResponse:
     """Get the latest price for a symbol"""
     try:
-        price_data = await price_service.get_latest_price(db, symbol, provider)
+        price_data = await price_service.get_latest_price(db, symbol, provider, max_age)
         return PriceResponse(**price_data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SingleFlightOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (asyncio.TimeoutError, TimeoutError):
+        raise HTTPException(status_code=504, detail="Timed out waiting for price data")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/latest/batch", response_model=BatchPriceResponse)
+async def get_latest_prices(
+    symbols: str = Query(..., description="Comma-separated stock symbols (e.g., AAPL,MSFT)"),
+    provider: Optional[str] = Query(None, description="Data provider"),
+    max_age: Optional[float] = Query(None, ge=0, description="Accept cached prices up to this many seconds old"),
+    db: AsyncSession = Depends(get_async_db),
+    price_service: PriceService = Depends(get_price_service),
+) -> dict:
+    """Get the latest prices for several symbols"""
+    symbol_list = [symbol for symbol in symbols.split(",") if symbol.strip()]
+    if not symbol_list:
+        raise HTTPException(status_code=400, detail="At least one symbol is required")
+    if len(symbol_list) > settings.batch_max_symbols:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_max_symbols} symbols per request")
+
+    try:
+        return await price_service.get_latest_prices(db, symbol_list, provider, max_age)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/latest/processed", response_model=PriceResponse)
+async def get_latest_processed_price(
+    symbol: str = Query(..., description="Stock symbol (e.g., AAPL)"),
+    db: AsyncSession = Depends(get_async_db),
+    price_service: PriceService = Depends(get_price_service),
+) -> PriceResponse:
+    """Get the latest price processed by the pipeline, without calling a provider"""
+    try:
+        price_data = await price_service.get_latest_processed_price(db, symbol)
+        if not price_data:
+            raise HTTPException(status_code=404, detail="Processed price not found")
+        return PriceResponse(**price_data)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 @router.post("/poll", response_model=PollResponse, status_code=202)
 async def create_poll_job(
-    request: PollRequest, db: Session = Depends(get_db), price_service: PriceService = Depends(get_price_service)
-):
+    request: PollRequest, db: AsyncSession = Depends(get_async_db), price_service: PriceService = Depends(get_price_service)
+) -> PollResponse:
     """Create a polling job for multiple symbols"""
     try:
         job_data = await price_service.create_polling_job(db, request.symbols, request.interval, request.provider)
@@ -46,17 +105,134 @@ async def create_poll_job(
 @router.get("/moving-average", response_model=MovingAverageResponse)
 async def get_moving_average(
     symbol: str = Query(..., description="Stock symbol (e.g., AAPL)"),
-    window: Optional[int] = Query(None, description="Moving average window size"),
-    db: Session = Depends(get_db),
+    window: Optional[int] = Query(None, ge=1, description="Moving average window size"),
+    kind: str = Query("sma", pattern="^(sma|ema)$", description="Moving average kind (sma or ema)"),
+    db: AsyncSession = Depends(get_async_db),
     price_service: PriceService = Depends(get_price_service),
-):
+) -> MovingAverageResponse:
     """Get the latest moving average for a symbol"""
     try:
-        ma_data = price_service.get_moving_average(db, symbol, window)
+        ma_data = await price_service.get_moving_average(db, symbol, window, kind)
         if not ma_data:
             raise HTTPException(status_code=404, detail="Moving average not found")
         return MovingAverageResponse(**ma_data)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/history", response_model=PriceHistoryResponse)
+async def get_price_history(
+    symbol: str = Query(..., description="Stock symbol (e.g., AAPL)"),
+    start: Optional[datetime] = Query(None, description="Start of the range, inclusive (default: a day before end)"),
+    end: Optional[datetime] = Query(None, description="End of the range, exclusive (default: now)"),
+    bucket: str = Query("1m", pattern="^(1m|5m|1h)$", description="Bar width (1m, 5m or 1h)"),
+    db: AsyncSession = Depends(get_async_db),
+    price_service: PriceService = Depends(get_price_service),
+) -> PriceHistoryResponse:
+    """Get OHLC bars of processed prices for a symbol, as columns"""
+    try:
+        history = await price_service.get_price_history(db, symbol, start, end, bucket)
+        return PriceHistoryResponse(**history)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.get("/export")
+async def export_prices(
+    table: str = Query("processed_prices", pattern="^(processed_prices|raw_market_data)$", description="Table to export"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$", description="Output format (ndjson, csv or arrow)"),
+    symbol: Optional[str] = Query(None, description="Only export this symbol"),
+    start: Optional[datetime] = Query(None, description="Start of the range, inclusive"),
+    end: Optional[datetime] = Query(None, description="End of the range, exclusive"),
+    session_factory: async_sessionmaker = Depends(get_async_sessionmaker),
+) -> StreamingResponse:
+    """Stream rows of a price table; memory use does not depend on the number of rows"""
+    try:
+        query = export_query(table, symbol, start, end)
+        encoder = get_encoder(format, query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    extension = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        stream_export(session_factory, query, encoder),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'},
+    )
+
+
+@router.websocket("/ws")
+async def stream_prices_ws(
+    websocket: WebSocket,
+    symbols: str = Query("", description="Comma-separated stock symbols to subscribe to"),
+    hub: PriceHub = Depends(get_price_hub),
+) -> None:
+    """Push live prices as JSON frames
+
+    Clients may change symbols by sending {"subscribe": [...]} or
+    {"unsubscribe": [...]}.
+    """
+    await websocket.accept()
+    try:
+        subscription = hub.subscribe(symbols)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+
+    receiving = asyncio.ensure_future(websocket.receive_text())
+    sending = asyncio.ensure_future(subscription.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receiving, sending}, return_when=asyncio.FIRST_COMPLETED)
+            if sending in done:
+                frame = sending.result()
+                if frame is not None:  # get() without a timeout always returns a frame
+                    await websocket.send_text(frame)
+                sending = asyncio.ensure_future(subscription.get())
+            if receiving in done:
+                text = receiving.result()
+                receiving = asyncio.ensure_future(websocket.receive_text())
+                try:
+                    message = json.loads(text)
+                    hub.update(subscription, add=message.get("subscribe", ()), remove=message.get("unsubscribe", ()))
+                except (ValueError, AttributeError, TypeError) as e:
+                    await websocket.send_text(json.dumps({"error": str(e)}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiving.cancel()
+        sending.cancel()
+        hub.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stream_prices_sse(
+    request: Request,
+    symbols: str = Query(..., description="Comma-separated stock symbols (e.g., AAPL,MSFT)"),
+    hub: PriceHub = Depends(get_price_hub),
+) -> StreamingResponse:
+    """Push live prices as Server-Sent Events"""
+    try:
+        symbol_set = hub.validate(symbols)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events() -> AsyncIterator[str]:
+        # Subscribed inside the body, so a client that leaves before it starts leaves no subscription behind
+        subscription = hub.subscribe(symbol_set)
+        try:
+            while not await request.is_disconnected():
+                frame = await subscription.get(timeout=settings.live_sse_keepalive)
+                yield f"event: price\ndata: {frame}\n\n" if frame else ": keepalive\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,17 +1,106 @@
-from sqlalchemy import create_engine
+from typing import Any, AsyncIterator, Optional, Union
+from datetime import datetime, timedelta
+from sqlalchemy import ColumnElement, DateTime, Integer, Interval, cast, create_engine, func, literal, type_coerce
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from .config import settings
 
-engine = create_engine(settings.database_url, pool_pre_ping=True, pool_recycle=300, echo=settings.debug)
+
+def _pool_options(url: str) -> dict:
+    """Connection pool options for a database URL (SQLite manages its own pool)"""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True,
+    }
+
+
+engine = create_engine(settings.database_url, echo=settings.debug, **_pool_options(settings.database_url))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def upsert_statement(session: Union[Session, AsyncSession], model: Any) -> Any:
+    """INSERT for the session's dialect that supports on_conflict_do_update (PostgreSQL or SQLite)"""
+    if session.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects import sqlite
+
+        return sqlite.insert(model)
+    from sqlalchemy.dialects import postgresql
+
+    return postgresql.insert(model)
+
+
+def time_bucket(session: Union[Session, AsyncSession], column: Any, seconds: int) -> ColumnElement[Any]:
+    """Expression truncating a timestamp column to the start of its `seconds`-wide bucket
+
+    Uses date_bin on PostgreSQL; SQLite buckets the Unix epoch instead.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        epoch = cast(func.strftime("%s", column), Integer)
+        return type_coerce(func.datetime(epoch // seconds * seconds, "unixepoch"), DateTime)
+    return func.date_bin(
+        literal(timedelta(seconds=seconds), Interval), column, literal(datetime(1970, 1, 1), DateTime), type_=DateTime
+    )
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_async_database_url() -> str:
+    """Async driver URL, derived from DATABASE_URL unless ASYNC_DATABASE_URL is set"""
+    if settings.async_database_url:
+        return settings.async_database_url
+
+    url = make_url(settings.database_url)
+    if url.get_backend_name() == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    elif url.get_backend_name() == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    return url.render_as_string(hide_password=False)
+
+
+# The async engine is created on first use so importing this module does not require asyncpg
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        url = get_async_database_url()
+        _async_engine = create_async_engine(url, echo=settings.debug, **_pool_options(url))
+    return _async_engine
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return _async_session_factory
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    """Close all pooled async connections"""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_session_factory = None
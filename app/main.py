@@ -1,18 +1,65 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import prices
 from app.core.config import settings
+from app.core.database import dispose_async_engine
+from app.services.cache import PriceCache
+from app.services.live import PriceHub
+from app.services.market_data import close_providers
+from app.services.price_service import PriceService
+from app.services.scheduler import PollingScheduler
+from app.services.write_behind import RawDataWriter
+import asyncio
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Create shared services on startup and release them on shutdown"""
+    # One PriceService (and Kafka producer) for the whole process
+    cache = PriceCache() if settings.price_cache_enabled else None
+    raw_writer = None
+    if settings.raw_write_behind_enabled:
+        raw_writer = RawDataWriter()
+        raw_writer.start()
+    app.state.price_service = PriceService(cache=cache, raw_writer=raw_writer)
+    # Its Kafka consumer starts with the first live subscriber
+    app.state.price_hub = PriceHub()
+    logger.info("Price service started")
+
+    scheduler: Optional[PollingScheduler] = None
+    scheduler_task: Optional[asyncio.Task] = None
+    if settings.scheduler_enabled:
+        scheduler = PollingScheduler(app.state.price_service)
+        scheduler_task = asyncio.create_task(scheduler.run())
+
+    yield
+
+    if scheduler is not None:
+        scheduler.stop()
+    if scheduler_task is not None:
+        await scheduler_task
+    await app.state.price_hub.close()
+    await app.state.price_service.close()
+    await close_providers()
+    await dispose_async_engine()
+    logger.info("Price service stopped")
+
+
 app = FastAPI(
     title=settings.app_name,
     description="A production-ready microservice for market data processing",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -1,5 +1,21 @@
 """Database models package"""
 
-from .price import RawMarketData, ProcessedPrice, MovingAverage, PollingJob
+from .price import (
+    RawMarketData,
+    ProcessedPrice,
+    MovingAverage,
+    LatestPrice,
+    LatestMovingAverage,
+    PollingJob,
+    SchedulerInstance,
+)
 
-__all__ = ["RawMarketData", "ProcessedPrice", "MovingAverage", "PollingJob"]
+__all__ = [
+    "RawMarketData",
+    "ProcessedPrice",
+    "MovingAverage",
+    "LatestPrice",
+    "LatestMovingAverage",
+    "PollingJob",
+    "SchedulerInstance",
+]
@@ -41,11 +41,36 @@ class MovingAverage(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     symbol = Column(String(10), nullable=False)
+    kind = Column(String(10), default="sma", nullable=False)  # sma or ema
     window_size = Column(Integer, nullable=False)
     value = Column(Float, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
 
-    __table_args__ = (Index("ix_moving_averages_symbol_window", "symbol", "window_size", "timestamp"),)
+    __table_args__ = (Index("ix_moving_averages_symbol_window", "symbol", "kind", "window_size", "timestamp"),)
+
+
+class LatestPrice(Base):
+    """Most recent processed price per symbol, upserted by the consumer"""
+
+    __tablename__ = "latest_prices"
+
+    symbol = Column(String(10), primary_key=True)
+    price = Column(Float, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    provider = Column(String(50), nullable=False)
+    raw_response_id = Column(UUID(as_uuid=True), nullable=True)
+
+
+class LatestMovingAverage(Base):
+    """Most recent moving average per symbol, kind and window, upserted by the consumer"""
+
+    __tablename__ = "latest_moving_averages"
+
+    symbol = Column(String(10), primary_key=True)
+    kind = Column(String(10), primary_key=True)
+    window_size = Column(Integer, primary_key=True)
+    value = Column(Float, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
 
 
 class PollingJob(Base):
@@ -59,8 +84,18 @@ class PollingJob(Base):
     status = Column(String(20), default="active", nullable=False)  # active, paused, stopped
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     last_run = Column(DateTime, nullable=True)
+    lease_owner = Column(String(100), nullable=True)  # scheduler instance running the job
+    lease_expires_at = Column(DateTime, nullable=True)
 
     __table_args__ = (
         Index("ix_polling_jobs_status", "status"),
         Index("ix_polling_jobs_job_id", "job_id"),
+        Index("ix_polling_jobs_lease", "lease_owner", "lease_expires_at"),
     )
+
+
+class SchedulerInstance(Base):
+    __tablename__ = "scheduler_instances"
+
+    instance_id = Column(String(100), primary_key=True)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -1,6 +1,16 @@
 """Pydantic schemas for API request/response validation"""
 
-from .price import PriceResponse, MovingAverageResponse
+from .price import PriceResponse, MovingAverageResponse, PriceError, BatchPriceResponse, PriceHistoryResponse
 from .job import PollRequest, PollResponse, JobConfig, JobStatus
 
-__all__ = ["PriceResponse", "MovingAverageResponse", "PollRequest", "PollResponse", "JobConfig", "JobStatus"]
+__all__ = [
+    "PriceResponse",
+    "MovingAverageResponse",
+    "PriceError",
+    "BatchPriceResponse",
+    "PriceHistoryResponse",
+    "PollRequest",
+    "PollResponse",
+    "JobConfig",
+    "JobStatus",
+]
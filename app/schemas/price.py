@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
 class PriceResponse(BaseModel):
@@ -19,9 +19,37 @@ class MovingAverageResponse(BaseModel):
     """Response schema for moving average data"""
 
     symbol: str
+    kind: str = "sma"
     window_size: int
     value: float
     timestamp: datetime
 
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat() + "Z"}
+
+
+class PriceError(BaseModel):
+    """Error for a single symbol in a batch request"""
+
+    symbol: str
+    detail: str
+
+
+class BatchPriceResponse(BaseModel):
+    """Response schema for multi-symbol price data"""
+
+    prices: List[PriceResponse]
+    errors: List[PriceError]
+
+
+class PriceHistoryResponse(BaseModel):
+    """Response schema for OHLC price history, one list entry per bucket"""
+
+    symbol: str
+    bucket: str
+    timestamps: List[str]
+    open: List[float]
+    high: List[float]
+    low: List[float]
+    close: List[float]
+    count: List[int]
@@ -1,5 +1,6 @@
 """Business logic services package"""
 
 from .price_service import PriceService
+from .scheduler import PollingScheduler
 
-__all__ = ["PriceService"]
+__all__ = ["PriceService", "PollingScheduler"]
@@ -0,0 +1,57 @@
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PriceCache:
+    """Redis-backed cache of the latest price per provider and symbol
+
+    The cache is best effort: Redis errors are logged and treated as misses.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: Optional[int] = None):
+        self.redis = redis.from_url(redis_url or settings.redis_url, decode_responses=True)
+        self.ttl = ttl or settings.price_cache_ttl
+
+    @staticmethod
+    def _key(provider: str, symbol: str) -> str:
+        return f"price:latest:{provider}:{symbol.upper()}"
+
+    async def get(self, provider: str, symbol: str, max_age: float) -> Optional[Dict[str, Any]]:
+        """Get a cached price if it was fetched at most max_age seconds ago"""
+        if max_age <= 0:
+            return None
+
+        try:
+            cached = await self.redis.get(self._key(provider, symbol))
+        except RedisError as e:
+            logger.warning(f"Price cache read failed for {symbol}: {e}")
+            return None
+
+        if not cached:
+            return None
+
+        entry = json.loads(cached)
+        if time.time() - entry["cached_at"] > max_age:
+            return None
+        data: Dict[str, Any] = entry["data"]
+        return data
+
+    async def set(self, provider: str, symbol: str, data: Dict[str, Any]) -> None:
+        """Store the latest price for a symbol"""
+        entry = json.dumps({"cached_at": time.time(), "data": data})
+        try:
+            await self.redis.set(self._key(provider, symbol), entry, ex=self.ttl)
+        except RedisError as e:
+            logger.warning(f"Price cache write failed for {symbol}: {e}")
+
+    async def close(self) -> None:
+        await self.redis.aclose()
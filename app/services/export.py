@@ -0,0 +1,226 @@
+"""Streaming bulk export of price tables
+
+Rows are read through a server-side cursor (yield_per) in batches of
+EXPORT_BATCH_SIZE and encoded batch by batch, so memory use does not grow
+with the size of the export. The same encoders back the API endpoint and
+scripts/export_prices.py.
+"""
+
+import csv
+import io
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Type, Union
+
+from sqlalchemy import ColumnElement, DateTime, Float, Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.price import ProcessedPrice, RawMarketData
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow export is optional
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_TABLES: Dict[str, Union[Type[ProcessedPrice], Type[RawMarketData]]] = {
+    "processed_prices": ProcessedPrice,
+    "raw_market_data": RawMarketData,
+}
+
+NDJSON = "ndjson"
+CSV = "csv"
+ARROW = "arrow"
+
+MEDIA_TYPES = {NDJSON: "application/x-ndjson", CSV: "text/csv", ARROW: "application/vnd.apache.arrow.stream"}
+
+
+def available_formats() -> List[str]:
+    return [NDJSON, CSV] + ([ARROW] if pa is not None else [])
+
+
+def export_query(
+    table: str, symbol: Optional[str] = None, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> Select:
+    """Rows of a table in (symbol, timestamp) order, optionally for one symbol and [start, end)"""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table: {table} (expected one of {', '.join(EXPORT_TABLES)})")
+    model = EXPORT_TABLES[table]
+
+    # Ordered like the (symbol, timestamp) index so PostgreSQL can stream it without sorting
+    query = select(*model.__table__.columns).order_by(model.symbol, model.timestamp)
+    if symbol:
+        query = query.where(model.symbol == symbol.upper())
+    if start:
+        query = query.where(model.timestamp >= _naive_utc(start))
+    if end:
+        query = query.where(model.timestamp < _naive_utc(end))
+    return query
+
+
+def _naive_utc(timestamp: datetime) -> datetime:
+    """Timestamps are stored as naive UTC"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _to_text(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat() + "Z"
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class ExportEncoder(ABC):
+    """Turns batches of rows into chunks of the output format"""
+
+    def __init__(self, columns: Iterable[ColumnElement[Any]]) -> None:
+        self.columns = list(columns)
+        self.names = [column.name for column in self.columns]
+
+    def header(self) -> bytes:
+        return b""
+
+    @abstractmethod
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        pass
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder(ExportEncoder):
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        lines = (json.dumps(dict(zip(self.names, map(_to_text, row)))) for row in rows)
+        return "".join(line + "\n" for line in lines).encode("utf-8")
+
+
+class CsvEncoder(ExportEncoder):
+    def header(self) -> bytes:
+        return self._write([self.names])
+
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        return self._write([map(_to_text, row) for row in rows])
+
+    @staticmethod
+    def _write(rows: Iterable[Iterable[Any]]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file that hands back what was written since the last drain"""
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+class ArrowEncoder(ExportEncoder):
+    """Arrow IPC stream: the schema, then one record batch per batch of rows"""
+
+    def __init__(self, columns: Iterable[ColumnElement[Any]]) -> None:
+        if pa is None:
+            raise ValueError("Arrow export requires pyarrow to be installed")
+        super().__init__(columns)
+        self.schema = pa.schema([(column.name, self._arrow_type(column)) for column in self.columns])
+        self.sink = _ChunkSink()
+        self.writer = pa.ipc.new_stream(pa.PythonFile(self.sink, mode="w"), self.schema)
+
+    @staticmethod
+    def _arrow_type(column: ColumnElement[Any]) -> Any:
+        if isinstance(column.type, DateTime):
+            return pa.timestamp("us")
+        if isinstance(column.type, Float):
+            return pa.float64()
+        return pa.string()
+
+    def header(self) -> bytes:
+        return self.sink.drain()
+
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        arrays = [
+            [value if value is None or isinstance(value, (datetime, float)) else str(value) for value in column]
+            for column in zip(*rows)
+        ]
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self.sink.drain()
+
+    def footer(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+ENCODERS: Dict[str, Callable[[Iterable[ColumnElement[Any]]], ExportEncoder]] = {
+    NDJSON: NdjsonEncoder,
+    CSV: CsvEncoder,
+    ARROW: ArrowEncoder,
+}
+
+
+def get_encoder(fmt: str, query: Select) -> ExportEncoder:
+    """Encoder for a query's columns; raises ValueError before any output for a bad format"""
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(ENCODERS)})")
+    return ENCODERS[fmt](query.selected_columns)
+
+
+async def stream_export(
+    session_factory: Callable[[], AsyncSession], query: Select, encoder: ExportEncoder, batch_size: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """Encode the rows of a query, batch by batch, from a server-side cursor
+
+    Opens its own session, since a streaming response outlives the request's
+    dependencies.
+    """
+    batch_size = batch_size or settings.export_batch_size
+    rows = 0
+
+    yield encoder.header()
+    async with session_factory() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for batch in result.partitions():
+            rows += len(batch)
+            yield encoder.encode(batch)
+    yield encoder.footer()
+    logger.info(f"Exported {rows} rows")
+
+
+def iter_export(db: Session, query: Select, encoder: ExportEncoder, batch_size: Optional[int] = None) -> Iterator[bytes]:
+    """Synchronous stream_export for scripts, on an existing session"""
+    batch_size = batch_size or settings.export_batch_size
+
+    yield encoder.header()
+    result = db.execute(query.execution_options(yield_per=batch_size))
+    for batch in result.partitions():
+        yield encoder.encode(batch)
+    yield encoder.footer()
@@ -2,5 +2,6 @@
 
 from .producer import PriceEventProducer
 from .consumer import MovingAverageConsumer
+from .supervisor import ConsumerSupervisor
 
-__all__ = ["PriceEventProducer", "MovingAverageConsumer"]
+__all__ = ["PriceEventProducer", "MovingAverageConsumer", "ConsumerSupervisor"]
@@ -1,142 +1,415 @@
 import json
 import logging
-from typing import List, Dict, Any
-from confluent_kafka import Consumer, KafkaError
+import struct
+import threading
+import uuid
+import concurrent.futures
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set, Tuple, Union
+from confluent_kafka import Consumer, KafkaError, KafkaException, Message, Producer, TopicPartition
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app.core.database import SessionLocal
-from app.models.price import ProcessedPrice, MovingAverage
+from sqlalchemy import desc, insert
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from app.core.database import SessionLocal, upsert_statement
+from app.models.price import ProcessedPrice, MovingAverage, LatestPrice, LatestMovingAverage
 from app.core.config import settings
+from .indicators import EMA, SMA, IndicatorEngine, precomputed_windows
+from .serialization import Headers, decode_price_event
 import asyncio
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Database errors worth retrying indefinitely; anything else may be a bad event
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError)
+
 
 class MovingAverageConsumer:
     """Kafka consumer for calculating moving averages"""
 
-    def __init__(self):
+    def __init__(self, client_id: str = "ma-consumer") -> None:
         self.config = {
             "bootstrap.servers": settings.kafka_bootstrap_servers,
             "group.id": settings.kafka_group_id,
-            "client.id": "ma-consumer",
+            "client.id": client_id,
             "auto.offset.reset": "latest",
-            "enable.auto.commit": True,
-            "auto.commit.interval.ms": 1000,
+            # Offsets are committed manually after each batch is stored
+            "enable.auto.commit": False,
         }
         self.consumer = Consumer(self.config)
         self.topic = settings.kafka_topic_price_events
         self.window_size = settings.moving_average_window
+        precomputed = precomputed_windows()
+        self.windows = IndicatorEngine(precomputed[SMA], precomputed[EMA])
+        self.batch_size = settings.consumer_batch_size
+        self.batch_timeout = settings.consumer_batch_timeout_ms / 1000
+        self.num_workers = settings.consumer_workers
+        self.max_retries = settings.consumer_max_retries
+        self.dead_letter_topic = settings.kafka_topic_dead_letter
+        self.dead_letter_producer: Optional[Producer] = None
+        self.queue_size = settings.consumer_queue_size
+        self.drain_timeout = 30.0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queues: List[asyncio.Queue] = []
+        self.executor: Optional[ThreadPoolExecutor] = None
         self.running = False
+        # Partitions whose batch was dropped uncommitted; nothing after it may be committed
+        self.abandoned: Set[Tuple[str, int]] = set()
+        self.revoking = False  # set while a rebalance waits for the workers to drain
+
+    def _load_history(self, db: Session, symbol: str) -> List[float]:
+        """Load the most recent prices for a symbol, oldest first"""
+        recent_prices = (
+            db.query(ProcessedPrice.price)
+            .filter(ProcessedPrice.symbol == symbol)
+            .order_by(desc(ProcessedPrice.timestamp))
+            .limit(self.windows.seed_size)
+            .all()
+        )
+        return [p.price for p in reversed(recent_prices)]
+
+    def calculate_indicators(self, db: Session, symbol: str, prices: List[float]) -> Dict[Tuple[str, int], List[float]]:
+        """Calculate every configured indicator at each new price of a symbol
+
+        History is only read from the database the first time a symbol is seen
+        (or after a restart/rebalance); after that each batch is one
+        vectorized update of the in-memory state.
+        """
+        if symbol not in self.windows:
+            self.windows.seed(symbol, self._load_history(db, symbol))
+        return {indicator: values.tolist() for indicator, values in self.windows.update(symbol, prices).items()}
 
-    def calculate_moving_average(self, db: Session, symbol: str, new_price: float) -> float:
-        """Calculate 5-point moving average for a symbol"""
+    def parse_price_event(self, message_value: Union[bytes, str], headers: Headers = None) -> Optional[Dict[str, Any]]:
+        """Parse a price event message (JSON or binary), returning None if it is malformed"""
         try:
-            # Get the last 4 prices (we'll add the new one to make 5)
-            recent_prices = (
-                db.query(ProcessedPrice.price)
-                .filter(ProcessedPrice.symbol == symbol)
-                .order_by(desc(ProcessedPrice.timestamp))
-                .limit(self.window_size - 1)
-                .all()
-            )
+            data = decode_price_event(message_value, headers)
+            return {
+                "symbol": data["symbol"],
+                "price": data["price"],
+                "timestamp": data["timestamp"],
+                "provider": data["source"],
+                "raw_response_id": uuid.UUID(data["raw_response_id"]) if data["raw_response_id"] else None,
+            }
+
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse message JSON: {e}")
+        except (KeyError, TypeError, ValueError, struct.error) as e:
+            logger.error(f"Invalid price event {message_value!r}: {e}")
+        return None
 
-            # Include the new price
-            prices = [new_price] + [p.price for p in recent_prices]
+    def store_price_events(self, events: List[Dict[str, Any]]) -> None:
+        """Calculate moving averages and bulk insert a batch of events in one transaction"""
+        if not events:
+            return
 
-            # If we don't have enough data points, return the average of what we have
-            if len(prices) < self.window_size:
-                return sum(prices) / len(prices)
+        db = SessionLocal()
+        try:
+            processed_rows = events
+            moving_average_rows: List[Dict[str, Any]] = []
 
-            # Calculate moving average for exactly window_size points
-            return sum(prices[: self.window_size]) / self.window_size
+            prices_by_symbol: Dict[str, List[float]] = defaultdict(list)
+            timestamps_by_symbol: Dict[str, List[datetime]] = defaultdict(list)
+            for event in events:
+                prices_by_symbol[event["symbol"]].append(event["price"])
+                timestamps_by_symbol[event["symbol"]].append(event["timestamp"])
 
-        except Exception as e:
-            logger.error(f"Error calculating moving average for {symbol}: {e}")
-            return new_price  # Fallback to current price
+            # Calculate before storing so seeding never sees the new prices. Each value
+            # is stamped with its tick's time, so history and latest rows order correctly.
+            for symbol, prices in prices_by_symbol.items():
+                for (kind, window), values in self.calculate_indicators(db, symbol, prices).items():
+                    moving_average_rows.extend(
+                        {"symbol": symbol, "kind": kind, "window_size": window, "value": value, "timestamp": timestamp}
+                        for value, timestamp in zip(values, timestamps_by_symbol[symbol])
+                    )
+
+            db.execute(insert(ProcessedPrice), processed_rows)
+            db.execute(insert(MovingAverage), moving_average_rows)
+            self._upsert_latest(db, processed_rows, moving_average_rows)
+            db.commit()
+
+        except Exception:
+            # The windows already hold these prices; drop them so they are re-seeded
+            db.rollback()
+            self.windows.reset({event["symbol"] for event in events})
+            raise
+        finally:
+            db.close()
+
+    def _upsert_latest(
+        self, db: Session, processed_rows: List[Dict[str, Any]], moving_average_rows: List[Dict[str, Any]]
+    ) -> None:
+        """Upsert the latest price and moving average per key in the batch's transaction
+
+        Only the newest row per key is written (one statement cannot update a
+        row twice), and an existing row is only replaced by a newer one, so
+        redelivered events never move the latest value backwards.
+        """
+        latest_prices: Dict[str, Dict[str, Any]] = {}
+        for row in processed_rows:
+            current = latest_prices.get(row["symbol"])
+            if current is None or row["timestamp"] >= current["timestamp"]:
+                latest_prices[row["symbol"]] = row
+        latest_averages = {(row["symbol"], row["kind"], row["window_size"]): row for row in moving_average_rows}
+
+        # Sorted keys keep lock order stable across concurrent transactions
+        stmt = upsert_statement(db, LatestPrice)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[LatestPrice.symbol],
+                set_={
+                    "price": stmt.excluded.price,
+                    "timestamp": stmt.excluded.timestamp,
+                    "provider": stmt.excluded.provider,
+                    "raw_response_id": stmt.excluded.raw_response_id,
+                },
+                where=LatestPrice.timestamp <= stmt.excluded.timestamp,
+            ),
+            [latest_prices[symbol] for symbol in sorted(latest_prices)],
+        )
 
-    def process_price_event(self, message_value: str):
+        stmt = upsert_statement(db, LatestMovingAverage)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[LatestMovingAverage.symbol, LatestMovingAverage.kind, LatestMovingAverage.window_size],
+                set_={"value": stmt.excluded.value, "timestamp": stmt.excluded.timestamp},
+                where=LatestMovingAverage.timestamp <= stmt.excluded.timestamp,
+            ),
+            [latest_averages[key] for key in sorted(latest_averages)],
+        )
+
+    def process_price_event(self, message_value: str) -> None:
         """Process a single price event message"""
         try:
-            # Parse the message
-            data = json.loads(message_value)
-            symbol = data["symbol"]
-            price = data["price"]
-            timestamp_str = data["timestamp"]
-            source = data["source"]
-
-            # Parse timestamp
-            if timestamp_str.endswith("Z"):
-                timestamp_str = timestamp_str[:-1]
-            timestamp = datetime.fromisoformat(timestamp_str)
-
-            db = SessionLocal()
-            try:
-                # Store processed price
-                processed_price = ProcessedPrice(symbol=symbol, price=price, timestamp=timestamp, provider=source)
-                db.add(processed_price)
-                db.commit()
+            event = self.parse_price_event(message_value)
+            if event:
+                self.store_price_events([event])
+                logger.info(f"Processed price event for {event['symbol']}: price={event['price']}")
+        except Exception as e:
+            logger.error(f"Error processing price event: {e}")
 
-                # Calculate and store moving average
-                ma_value = self.calculate_moving_average(db, symbol, price)
+    def process_batch(self, messages: List[Message], isolate_failures: bool = False) -> None:
+        """Store a batch of Kafka messages, then commit their offsets
 
-                moving_avg = MovingAverage(
-                    symbol=symbol, window_size=self.window_size, value=ma_value, timestamp=datetime.utcnow()
-                )
-                db.add(moving_avg)
-                db.commit()
+        Offsets are only committed once the database transaction succeeds, so a
+        crash between the two redelivers the batch instead of losing it. With
+        isolate_failures, events that cannot be stored are dead-lettered and
+        the rest of the batch is stored and committed.
+        """
+        parsed: List[Tuple[Message, Dict[str, Any]]] = []
+        for msg in messages:
+            event = self.parse_price_event(msg.value(), msg.headers())
+            if event:
+                parsed.append((msg, event))
+        events = [event for _, event in parsed]
 
-                logger.info(f"Processed price event for {symbol}: price={price}, MA={ma_value:.2f}")
+        if isolate_failures:
+            self._store_isolating(parsed)
+        else:
+            self.store_price_events(events)
 
-            finally:
-                db.close()
+        offsets: Dict[Tuple[str, int], int] = {}
+        for msg in messages:
+            offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+        try:
+            self.consumer.commit(
+                offsets=[TopicPartition(topic, partition, offset) for (topic, partition), offset in offsets.items()],
+                asynchronous=False,
+            )
+        except KafkaException as e:
+            # Rows are already stored; the batch may be redelivered (at-least-once)
+            logger.warning(f"Failed to commit offsets after storing batch: {e}")
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse message JSON: {e}")
+        logger.info(f"Processed batch of {len(events)} price events ({len(messages) - len(events)} skipped)")
+
+    def _store_isolating(self, parsed: List[Tuple[Message, Dict[str, Any]]]) -> None:
+        """Store events, splitting the batch in halves to find the ones that cannot be stored
+
+        Halves are stored in order, so each symbol's events still arrive in
+        order. Transient database errors are raised for the whole batch to retry.
+        """
+        try:
+            self.store_price_events([event for _, event in parsed])
+        except TRANSIENT_ERRORS:
+            raise
         except Exception as e:
-            logger.error(f"Error processing price event: {e}")
+            if len(parsed) == 1:
+                self._dead_letter(parsed[0][0], e)
+                return
+            middle = len(parsed) // 2
+            self._store_isolating(parsed[:middle])
+            self._store_isolating(parsed[middle:])
 
-    async def start_consuming(self):
-        """Start consuming messages"""
-        self.consumer.subscribe([self.topic])
-        self.running = True
+    def _dead_letter(self, msg: Message, error: Exception) -> None:
+        """Set aside a message that cannot be stored, so its partition can move on"""
+        logger.error(f"Dead-lettering price event at {msg.topic()}[{msg.partition()}]@{msg.offset()} {msg.value()!r}: {error}")
+        if not self.dead_letter_topic:
+            return
+        try:
+            if self.dead_letter_producer is None:
+                self.dead_letter_producer = Producer(
+                    {"bootstrap.servers": settings.kafka_bootstrap_servers, "client.id": "ma-consumer-dead-letter"}
+                )
+            self.dead_letter_producer.produce(
+                topic=self.dead_letter_topic,
+                key=msg.key(),
+                value=msg.value(),
+                headers=list(msg.headers() or []) + [("error", str(error).encode("utf-8"))],
+            )
+            self.dead_letter_producer.flush(10.0)
+        except Exception as e:
+            logger.error(f"Failed to dead-letter price event: {e}")
 
-        logger.info(f"Started consuming from topic: {self.topic}")
+    def _poll_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Consume from Kafka on a dedicated thread and hand batches to the workers
 
+        Messages are routed by partition, and price events are keyed by symbol,
+        so each symbol is always handled by the same worker in order.
+        """
         try:
             while self.running:
-                # Poll for messages
-                msg = self.consumer.poll(timeout=1.0)
+                # Wait for up to batch_size messages or batch_timeout
+                msgs = self.consumer.consume(num_messages=self.batch_size, timeout=self.batch_timeout)
 
-                if msg is None:
-                    # No message available, continue polling
-                    await asyncio.sleep(0.1)
-                    continue
-
-                if msg.error():
-                    if msg.error().code() == KafkaError._PARTITION_EOF:
-                        # End of partition - not an error
+                batches: Dict[int, List[Message]] = defaultdict(list)
+                for msg in msgs:
+                    if msg.error():
+                        if msg.error().code() != KafkaError._PARTITION_EOF:
+                            logger.error(f"Consumer error: {msg.error()}")
                         continue
-                    else:
-                        logger.error(f"Consumer error: {msg.error()}")
-                        continue
-
-                # Process the message
-                try:
-                    message_value = msg.value().decode("utf-8")
-                    self.process_price_event(message_value)
-                except Exception as e:
-                    logger.error(f"Error processing message: {e}")
+                    batches[msg.partition() % len(self.queues)].append(msg)
 
-                await asyncio.sleep(0.01)  # Small delay to prevent CPU spinning
+                for index, batch in batches.items():
+                    if not self._enqueue(loop, self.queues[index], batch):
+                        return
 
-        except KeyboardInterrupt:
-            logger.info("Received interrupt signal")
+        except Exception as e:
+            logger.error(f"Poller error: {e}")
         finally:
+            self.running = False
+            # Closing triggers a final revoke, which waits for the workers to drain
             self.consumer.close()
             logger.info("Consumer closed")
 
-    def stop(self):
+    def _enqueue(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, batch: List[Message]) -> bool:
+        """Put a batch on a worker queue, blocking the poller while the queue is full"""
+        future = asyncio.run_coroutine_threadsafe(queue.put(batch), loop)
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                if not self.running:
+                    future.cancel()
+                    return False
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        """Store batches from one queue in order
+
+        Transient database errors are retried until they clear. Other errors
+        are retried max_retries times; the batch is then stored with bad
+        events isolated and dead-lettered, so one poison event cannot stall
+        its partition. During shutdown or a rebalance a failed batch is dropped
+        instead of retried; it abandons its partitions:
+        later batches for them are skipped, so no offset is committed past it.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await queue.get()
+            try:
+                batch = [msg for msg in batch if (msg.topic(), msg.partition()) not in self.abandoned]
+                if not batch:
+                    continue
+                delay = 0.5
+                failures = 0
+                while True:
+                    try:
+                        isolate = failures >= self.max_retries
+                        await loop.run_in_executor(self.executor, self.process_batch, batch, isolate)
+                        break
+                    except Exception as e:
+                        if not self.running or self.revoking:
+                            logger.warning(f"Dropping uncommitted batch of {len(batch)} messages before revoke: {e}")
+                            self.abandoned.update((msg.topic(), msg.partition()) for msg in batch)
+                            break
+                        if not isinstance(e, TRANSIENT_ERRORS):
+                            failures += 1
+                        logger.error(f"Error processing batch of {len(batch)} messages, retrying in {delay:.1f}s: {e}")
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, 30.0)
+            finally:
+                queue.task_done()
+
+    async def _drain(self) -> None:
+        """Wait until every queued batch has been processed"""
+        await asyncio.gather(*(queue.join() for queue in self.queues))
+
+    def _on_assign(self, consumer: Consumer, partitions: List[TopicPartition]) -> None:
+        """Drop cached windows when new partitions are assigned
+
+        Another consumer may have processed our symbols in the meantime, so
+        the windows are rebuilt from the database on the next tick. Abandoned
+        partitions resume from their committed offsets, which redelivers the
+        dropped batch.
+        """
+        self.windows.reset()
+        self.abandoned.clear()
+
+    def _on_revoke(self, consumer: Consumer, partitions: List[TopicPartition]) -> None:
+        """Finish queued batches before partitions are handed to another consumer
+
+        Blocks until every worker is idle, so nothing is written or committed
+        for the partitions once they are revoked. Failing batches are dropped
+        instead of retried meanwhile, which keeps the wait bounded.
+        """
+        if self.loop and self.queues:
+            self.revoking = True
+            try:
+                future = asyncio.run_coroutine_threadsafe(self._drain(), self.loop)
+                while True:
+                    try:
+                        future.result(timeout=self.drain_timeout)
+                        break
+                    except concurrent.futures.TimeoutError:
+                        logger.warning("Still waiting for workers to drain before rebalance")
+            finally:
+                self.revoking = False
+        self.windows.reset()
+
+    async def start_consuming(self) -> None:
+        """Start consuming messages
+
+        A dedicated thread polls Kafka and feeds per-worker asyncio queues, so
+        the event loop is never blocked and throughput is bounded only by the
+        broker and the database.
+        """
+        self.consumer.subscribe([self.topic], on_assign=self._on_assign, on_revoke=self._on_revoke)
+        self.running = True
+        self.loop = asyncio.get_running_loop()
+        self.queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.num_workers)]
+        self.executor = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="ma-consumer-worker")
+
+        workers = [asyncio.create_task(self._worker(queue)) for queue in self.queues]
+        poller = threading.Thread(target=self._poll_loop, args=(self.loop,), name="ma-consumer-poller", daemon=True)
+        poller.start()
+
+        logger.info(f"Started consuming from topic: {self.topic} with {self.num_workers} workers")
+
+        try:
+            while poller.is_alive():
+                await asyncio.sleep(0.5)
+        finally:
+            self.running = False
+            # Keep the loop running while the poller closes the consumer
+            while poller.is_alive():
+                await asyncio.sleep(0.05)
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.executor.shutdown(wait=True)
+            if self.dead_letter_producer is not None:
+                self.dead_letter_producer.flush(10.0)
+
+    def stop(self) -> None:
         """Stop consuming messages"""
         self.running = False
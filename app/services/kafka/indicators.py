@@ -0,0 +1,124 @@
+from typing import Collection, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+SMA = "sma"
+EMA = "ema"
+
+Indicator = Tuple[str, int]  # (kind, window)
+
+
+def parse_windows(value: str) -> Set[int]:
+    """Parse a comma-separated list of window sizes"""
+    return {int(window) for window in value.split(",") if window.strip()}
+
+
+def precomputed_windows() -> Dict[str, Set[int]]:
+    """Windows of each kind the consumer keeps up to date; others are computed on demand"""
+    return {
+        SMA: parse_windows(settings.indicator_sma_windows) | {settings.moving_average_window},
+        EMA: parse_windows(settings.indicator_ema_windows),
+    }
+
+
+def sma(prices: np.ndarray, window: int, history: Optional[np.ndarray] = None) -> np.ndarray:
+    """Simple moving average at each price, over up to `window` prices ending there
+
+    `history` holds the prices before the first one, oldest first. Averages
+    near the start cover fewer prices until the window has filled.
+    """
+    if window < 1:
+        raise ValueError("Window size must be at least 1")
+    if history is None:
+        history = np.empty(0)
+    history = history[-(window - 1) :] if window > 1 else history[:0]
+
+    series = np.concatenate([history, prices])
+    sums = np.concatenate([[0.0], np.cumsum(series)])
+    ends = np.arange(len(history) + 1, len(series) + 1)
+    starts = np.maximum(ends - window, 0)
+    averages: np.ndarray = (sums[ends] - sums[starts]) / (ends - starts)
+    return averages
+
+
+def ema(prices: np.ndarray, window: int, previous: Optional[float] = None) -> np.ndarray:
+    """Exponential moving average at each price, continuing from `previous`
+
+    Uses the usual smoothing factor 2 / (window + 1); without a previous
+    value the first price starts the average.
+    """
+    if window < 1:
+        raise ValueError("Window size must be at least 1")
+    alpha = 2.0 / (window + 1)
+    values = np.empty(len(prices))
+    current = previous
+    for i, price in enumerate(prices):
+        current = price if current is None else current + alpha * (price - current)
+        values[i] = current
+    return values
+
+
+class IndicatorEngine:
+    """Per-symbol SMA and EMA state, updated one batch of prices at a time
+
+    Each symbol keeps its last max(SMA window) prices and the last value of
+    every EMA. A batch of prices for a symbol is turned into every indicator
+    value at every price in one vectorized pass per SMA window.
+    """
+
+    def __init__(self, sma_windows: Collection[int], ema_windows: Collection[int] = ()) -> None:
+        if not sma_windows and not ema_windows:
+            raise ValueError("At least one indicator window is required")
+        self.sma_windows = sorted(set(sma_windows))
+        self.ema_windows = sorted(set(ema_windows))
+        self.history_size = max(self.sma_windows, default=1)
+        self.history: Dict[str, np.ndarray] = {}
+        self.ema_values: Dict[str, Dict[int, float]] = {}
+
+    @property
+    def indicators(self) -> List[Indicator]:
+        return [(SMA, window) for window in self.sma_windows] + [(EMA, window) for window in self.ema_windows]
+
+    @property
+    def seed_size(self) -> int:
+        """Prices of history to seed a symbol with; EMAs get a few windows to settle"""
+        return max(self.history_size - 1, 3 * max(self.ema_windows, default=0), 1)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.history
+
+    def seed(self, symbol: str, prices: Iterable[float]) -> None:
+        """Load history for a symbol, oldest price first"""
+        series = np.asarray(list(prices), dtype=float)
+        self.history[symbol] = series[-self.history_size :]
+        self.ema_values[symbol] = {window: float(ema(series, window)[-1]) for window in self.ema_windows if len(series)}
+
+    def update(self, symbol: str, prices: Sequence[float]) -> Dict[Indicator, np.ndarray]:
+        """Add prices for a symbol, oldest first, and return each indicator at each price"""
+        batch = np.asarray(prices, dtype=float)
+        if not len(batch):
+            return {}
+        history = self.history.get(symbol, np.empty(0))
+        previous_ema = self.ema_values.setdefault(symbol, {})
+
+        values: Dict[Indicator, np.ndarray] = {}
+        for window in self.sma_windows:
+            values[(SMA, window)] = sma(batch, window, history)
+        for window in self.ema_windows:
+            values[(EMA, window)] = ema(batch, window, previous_ema.get(window))
+            previous_ema[window] = float(values[(EMA, window)][-1])
+
+        self.history[symbol] = np.concatenate([history, batch])[-self.history_size :]
+        return values
+
+    def reset(self, symbols: Optional[Iterable[str]] = None) -> None:
+        """Forget state so symbols are re-seeded from the database"""
+        if symbols is None:
+            self.history.clear()
+            self.ema_values.clear()
+            return
+        for symbol in symbols:
+            self.history.pop(symbol, None)
+            self.ema_values.pop(symbol, None)
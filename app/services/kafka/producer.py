@@ -1,68 +1,169 @@
-import json
+import asyncio
 import logging
-from typing import Dict, Any
-from confluent_kafka import Producer
+import threading
+import time
+from functools import partial
+from typing import Dict, Any, List, Optional
+from confluent_kafka import KafkaException, Producer
 from app.core.config import settings
+from .serialization import encode_price_event
 
 logger = logging.getLogger(__name__)
 
 
 class PriceEventProducer:
-    """Kafka producer for price events"""
+    """Kafka producer for price events
 
-    def __init__(self):
+    Messages are queued in the client without waiting for the broker. A
+    background thread services delivery callbacks, which resolve a future per
+    message; callers may await it to confirm delivery or ignore it. When the
+    local queue is full, producing waits for room (up to
+    KAFKA_PRODUCER_BACKPRESSURE_TIMEOUT) instead of failing right away.
+    """
+
+    def __init__(self) -> None:
         self.config = {
             "bootstrap.servers": settings.kafka_bootstrap_servers,
             "client.id": "market-data-producer",
             "acks": "all",  # Wait for all replicas
             "retries": 3,
-            "batch.size": 16384,
-            "linger.ms": 5,
-            "compression.type": "snappy",
+            "batch.size": settings.kafka_producer_batch_size,
+            "linger.ms": settings.kafka_producer_linger_ms,
+            "compression.type": settings.kafka_producer_compression,
+            "queue.buffering.max.messages": settings.kafka_producer_queue_max_messages,
         }
         self.producer = Producer(self.config)
         self.topic = settings.kafka_topic_price_events
+        self.encoding = settings.kafka_event_encoding
+
+        self.delivered = 0
+        self.failed = 0
+        self._poller: Optional[threading.Thread] = None
+        self._closing = threading.Event()
+
+    def _ensure_poller(self) -> None:
+        if self._poller is None:
+            self._poller = threading.Thread(target=self._poll_loop, name="kafka-producer-poll", daemon=True)
+            self._poller.start()
 
-    def delivery_callback(self, err, msg):
-        """Callback for message delivery confirmation"""
+    def _poll_loop(self) -> None:
+        """Service delivery callbacks until the producer is closed"""
+        while not self._closing.is_set():
+            try:
+                self.producer.poll(0.1)
+            except Exception as e:
+                logger.error(f"Kafka producer poll failed: {e}")
+
+    def delivery_callback(self, future: asyncio.Future, loop: asyncio.AbstractEventLoop, err: Any, msg: Any) -> None:
+        """Callback for message delivery confirmation; runs on the poll thread"""
         if err:
+            self.failed += 1
             logger.error(f"Message delivery failed: {err}")
         else:
+            self.delivered += 1
             logger.debug(f"Message delivered to {msg.topic()} [{msg.partition()}]")
 
-    async def produce_price_event(self, price_data: Dict[str, Any]):
-        """Produce a price event to Kafka"""
         try:
-            # Create the message payload
-            message = {
-                "symbol": price_data["symbol"],
-                "price": price_data["price"],
-                "timestamp": price_data["timestamp"],
-                "source": price_data["provider"],
-                "raw_response_id": str(price_data.get("raw_response_id", "")),
-            }
-
-            # Serialize to JSON
-            value = json.dumps(message).encode("utf-8")
-
-            # Produce the message
-            self.producer.produce(
-                topic=self.topic, key=price_data["symbol"].encode("utf-8"), value=value, callback=self.delivery_callback
-            )
-
-            # Trigger delivery report callbacks
-            self.producer.poll(0)
+            loop.call_soon_threadsafe(self._resolve, future, err, msg)
+        except RuntimeError:
+            pass  # the event loop has already been closed
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, err: Any, msg: Any) -> None:
+        if future.done():
+            return
+        if err:
+            future.set_exception(KafkaException(err))
+            # Nobody has to await the delivery; do not warn about an unretrieved error
+            future.exception()
+        else:
+            future.set_result(msg)
+
+    def _produce(self, price_data: Dict[str, Any], loop: asyncio.AbstractEventLoop) -> asyncio.Future:
+        """Queue a price event in the producer, returning its delivery future
+
+        Raises BufferError if the local queue is full.
+        """
+        # Create the message payload
+        raw_response_id = price_data.get("raw_response_id")
+        message = {
+            "symbol": price_data["symbol"],
+            "price": price_data["price"],
+            "timestamp": price_data["timestamp"],
+            "source": price_data["provider"],
+            "raw_response_id": str(raw_response_id) if raw_response_id else "",
+        }
+
+        # Serialize in the configured wire format; the header tells consumers which one
+        value, headers = encode_price_event(message, self.encoding)
+
+        future = loop.create_future()
 
+        # Produce the message
+        self.producer.produce(
+            topic=self.topic,
+            key=price_data["symbol"].encode("utf-8"),
+            value=value,
+            headers=headers,
+            callback=partial(self.delivery_callback, future, loop),
+        )
+        return future
+
+    async def _produce_with_backpressure(self, price_data: Dict[str, Any]) -> asyncio.Future:
+        """Queue a price event, waiting for room in the local queue if it is full"""
+        self._ensure_poller()
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + settings.kafka_producer_backpressure_timeout
+        delay = 0.005
+
+        while True:
+            try:
+                return self._produce(price_data, loop)
+            except BufferError:
+                if time.monotonic() >= deadline:
+                    raise
+                # The poll thread drains the queue as deliveries complete
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.1)
+
+    async def produce_price_event(self, price_data: Dict[str, Any]) -> asyncio.Future:
+        """Produce a price event to Kafka, returning a future for its delivery"""
+        try:
+            future = await self._produce_with_backpressure(price_data)
             logger.info(f"Produced price event for {price_data['symbol']}")
+            return future
 
         except Exception as e:
             logger.error(f"Failed to produce price event: {e}")
             raise
 
-    def flush(self, timeout: float = 10.0):
+    async def produce_price_events(self, events: List[Dict[str, Any]]) -> List[asyncio.Future]:
+        """Produce a batch of price events to Kafka, returning their delivery futures"""
+        try:
+            futures = [await self._produce_with_backpressure(price_data) for price_data in events]
+            logger.info(f"Produced {len(events)} price events")
+            return futures
+
+        except Exception as e:
+            logger.error(f"Failed to produce price events: {e}")
+            raise
+
+    def pending(self) -> int:
+        """Messages queued locally or awaiting delivery confirmation"""
+        return len(self.producer)
+
+    def flush(self, timeout: float = 10.0) -> None:
         """Flush pending messages"""
         self.producer.flush(timeout)
 
-    def close(self):
-        """Close the producer"""
-        self.producer.flush()
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop the poll thread, then flush pending messages"""
+        self._closing.set()
+        if self._poller is not None:
+            self._poller.join()
+            self._poller = None
+
+        remaining = self.producer.flush(timeout)
+        if remaining:
+            logger.warning(f"{remaining} price events were not delivered before shutdown")
+        logger.info(f"Kafka producer closed: {self.delivered} delivered, {self.failed} failed")
@@ -0,0 +1,127 @@
+"""Wire formats for price events
+
+Events are JSON by default. The binary format is a fixed struct with an
+epoch-nanosecond timestamp, followed by the symbol and source as
+length-prefixed UTF-8. The "encoding" message header says which format a
+message uses; messages without it are JSON, so consumers keep reading
+events from older producers while the producer format is switched.
+"""
+
+import json
+import struct
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+ENCODING_HEADER = "encoding"
+JSON = "json"
+BINARY = "binary"
+
+BINARY_VERSION = 1
+
+# version, timestamp (ns since epoch, UTC), price, raw_response_id, symbol length, source length
+_BINARY_V1 = struct.Struct("<Bqd16sBB")
+
+_EPOCH = datetime(1970, 1, 1)
+
+Headers = Optional[List[Tuple[str, bytes]]]
+
+
+def _naive_utc(timestamp: Union[str, datetime]) -> datetime:
+    """An ISO 8601 string or datetime as a naive UTC datetime; naive input is taken as UTC"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp[:-1] if timestamp.endswith("Z") else timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _to_epoch_ns(timestamp: Union[str, datetime]) -> int:
+    delta = _naive_utc(timestamp) - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
+
+
+def _from_epoch_ns(ns: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=ns // 1000)
+
+
+def encode_price_event(message: Dict[str, Any], encoding: str = JSON) -> Tuple[bytes, List[Tuple[str, bytes]]]:
+    """Encode a price event message, returning the value and its headers"""
+    if encoding == JSON:
+        return json.dumps(message).encode("utf-8"), [(ENCODING_HEADER, JSON.encode())]
+
+    if encoding != BINARY:
+        raise ValueError(f"Unknown price event encoding: {encoding}")
+
+    symbol = message["symbol"].encode("utf-8")
+    source = message["source"].encode("utf-8")
+    raw_response_id = message.get("raw_response_id")
+    raw_id = uuid.UUID(str(raw_response_id)).bytes if raw_response_id else bytes(16)
+
+    value = (
+        _BINARY_V1.pack(
+            BINARY_VERSION, _to_epoch_ns(message["timestamp"]), float(message["price"]), raw_id, len(symbol), len(source)
+        )
+        + symbol
+        + source
+    )
+    return value, [(ENCODING_HEADER, BINARY.encode())]
+
+
+def get_encoding(headers: Headers) -> str:
+    """Encoding named by the message headers; JSON when there is none"""
+    for key, value in headers or ():
+        if key == ENCODING_HEADER and value:
+            return value.decode("utf-8")
+    return JSON
+
+
+def _field(data: Dict[str, Any], name: str, types: Tuple[type, ...], optional: bool = False) -> Any:
+    """A JSON field of one of `types`; raises ValueError if it is missing or of another type"""
+    value = data.get(name)
+    if value is None and optional:
+        return None
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise ValueError(f"Price event field {name!r} has an invalid value: {value!r}")
+    return value
+
+
+def decode_price_event(value: Union[bytes, str], headers: Headers = None) -> Dict[str, Any]:
+    """Decode a price event into symbol, price, timestamp, source and raw_response_id
+
+    The timestamp is a naive UTC datetime. Raises ValueError when the message
+    is malformed, including JSON fields that are missing or of the wrong type.
+    """
+    encoding = get_encoding(headers)
+
+    if encoding == JSON:
+        data = json.loads(value)
+        if not isinstance(data, dict):
+            raise ValueError("Price event must be a JSON object")
+        return {
+            "symbol": _field(data, "symbol", (str,)),
+            "price": float(_field(data, "price", (int, float, str))),
+            "timestamp": _naive_utc(_field(data, "timestamp", (str,))),
+            "source": _field(data, "source", (str,)),
+            "raw_response_id": _field(data, "raw_response_id", (str,), optional=True) or None,
+        }
+
+    if encoding != BINARY:
+        raise ValueError(f"Unknown price event encoding: {encoding}")
+    if isinstance(value, str):
+        raise ValueError("Binary price events must be bytes")
+    if len(value) < _BINARY_V1.size or value[0] != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary price event (version {value[0] if value else None})")
+
+    version, ns, price, raw_id, symbol_len, source_len = _BINARY_V1.unpack_from(value)
+    offset = _BINARY_V1.size
+    if len(value) != offset + symbol_len + source_len:
+        raise ValueError("Truncated binary price event")
+
+    return {
+        "symbol": value[offset : offset + symbol_len].decode("utf-8"),
+        "price": price,
+        "timestamp": _from_epoch_ns(ns),
+        "source": value[offset + symbol_len :].decode("utf-8"),
+        "raw_response_id": str(uuid.UUID(bytes=raw_id)) if any(raw_id) else None,
+    }
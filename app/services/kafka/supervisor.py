@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+from typing import Any, List, Optional
+
+from .consumer import MovingAverageConsumer
+
+logger = logging.getLogger(__name__)
+
+
+async def serve_consumer(client_id: str = "ma-consumer") -> None:
+    """Run a MovingAverageConsumer until SIGINT or SIGTERM"""
+    consumer = MovingAverageConsumer(client_id=client_id)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, consumer.stop)
+
+    await consumer.start_consuming()
+
+
+def run_worker(index: int) -> None:
+    """Entry point of a consumer worker process"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(serve_consumer(client_id=f"ma-consumer-{index}"))
+
+
+class ConsumerSupervisor:
+    """Run and supervise several consumer processes in the same consumer group
+
+    Kafka spreads the partitions of the price topic across the workers, and
+    events are keyed by symbol, so every symbol is owned by exactly one
+    worker at a time. Crashed workers are restarted with exponential backoff.
+    """
+
+    def __init__(
+        self, processes: int, restart_delay: float = 1.0, max_restart_delay: float = 30.0, shutdown_timeout: float = 30.0
+    ) -> None:
+        if processes < 1:
+            raise ValueError("At least one consumer process is required")
+        self.processes = processes
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.workers: List[Optional[multiprocessing.process.BaseProcess]] = [None] * processes
+        self.started_at = [0.0] * processes
+        self.delays = [restart_delay] * processes
+        self.restart_at = [0.0] * processes
+        self.stopping = False
+
+    def _start(self, index: int) -> None:
+        worker = self.context.Process(target=run_worker, args=(index,), name=f"ma-consumer-{index}")
+        worker.start()
+        self.workers[index] = worker
+        self.started_at[index] = time.monotonic()
+        logger.info(f"Started consumer worker {index} (pid {worker.pid})")
+
+    def _check(self, index: int) -> None:
+        """Restart a worker that exited, backing off if it keeps crashing"""
+        worker = self.workers[index]
+        now = time.monotonic()
+
+        if worker is not None:
+            if worker.is_alive():
+                return
+            logger.error(f"Consumer worker {index} (pid {worker.pid}) exited with code {worker.exitcode}")
+            worker.close()
+            self.workers[index] = None
+
+            # A worker that stayed up for a while gets a fresh backoff
+            if now - self.started_at[index] > self.max_restart_delay * 2:
+                self.delays[index] = self.restart_delay
+            self.restart_at[index] = now + self.delays[index]
+            self.delays[index] = min(self.delays[index] * 2, self.max_restart_delay)
+
+        if now >= self.restart_at[index]:
+            self._start(index)
+
+    def stop(self, *args: Any) -> None:
+        """Ask the supervisor to shut down all workers"""
+        self.stopping = True
+
+    def run(self) -> None:
+        """Start the workers and supervise them until a shutdown signal arrives"""
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        logger.info(f"Starting {self.processes} consumer worker processes")
+        for index in range(self.processes):
+            self._start(index)
+
+        try:
+            while not self.stopping:
+                for index in range(self.processes):
+                    self._check(index)
+                time.sleep(0.5)
+        finally:
+            self._shutdown()
+
+    def _shutdown(self) -> None:
+        """Stop the workers gracefully, killing any that do not exit in time"""
+        alive = [worker for worker in self.workers if worker is not None and worker.is_alive()]
+        logger.info(f"Stopping {len(alive)} consumer worker processes...")
+
+        for worker in alive:
+            worker.terminate()  # SIGTERM: the worker finishes its batches and closes
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for worker in alive:
+            worker.join(max(0.0, deadline - time.monotonic()))
+            if worker.is_alive():
+                logger.warning(f"Consumer worker {worker.name} did not stop in time, killing it")
+                worker.kill()
+                worker.join()
+
+        logger.info("All consumer workers stopped")
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set
+
+from confluent_kafka import Consumer, KafkaError
+
+from app.core.config import settings
+from app.services.kafka.serialization import decode_price_event
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One client's symbols and its bounded queue of pending frames
+
+    When the client falls behind, the oldest frames are dropped: a live
+    dashboard wants the newest price, not a backlog.
+    """
+
+    def __init__(self, max_queue: Optional[int] = None):
+        self.symbols: Set[str] = set()
+        self.frames: Deque[str] = deque(maxlen=max_queue or settings.live_queue_size)
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def push(self, frame: str) -> None:
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1
+        self.frames.append(frame)
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Next frame, waiting for one; None if `timeout` seconds pass first"""
+        while not self.frames:
+            self._ready.clear()
+            if timeout is None:
+                await self._ready.wait()
+                continue
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.frames.popleft()
+
+
+def parse_symbols(symbols: Iterable[str]) -> Set[str]:
+    if isinstance(symbols, str):
+        symbols = symbols.split(",")
+    return {symbol.strip().upper() for symbol in symbols if symbol and symbol.strip()}
+
+
+class PriceHub:
+    """Fans price events out from one Kafka consumer to every live subscriber
+
+    The consumer joins a consumer group of its own, so each API process sees
+    every event, and starts with the first subscription. Each event is
+    encoded once and pushed to the queues of the subscribers of its symbol.
+    """
+
+    def __init__(self, consumer_factory: Optional[Callable[[], Any]] = None, max_symbols: Optional[int] = None):
+        self.consumer_factory = consumer_factory or self._create_consumer
+        self.max_symbols = max_symbols or settings.live_max_symbols
+        self.published = 0
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._closing = threading.Event()
+
+    @staticmethod
+    def _create_consumer() -> Consumer:
+        return Consumer(
+            {
+                "bootstrap.servers": settings.kafka_bootstrap_servers,
+                "group.id": f"{settings.live_group_prefix}-{socket.gethostname()}-{os.getpid()}",
+                "auto.offset.reset": "latest",
+                "enable.auto.commit": False,
+            }
+        )
+
+    def subscribers(self, symbol: str) -> int:
+        return len(self._subscribers.get(symbol, ()))
+
+    def validate(self, symbols: Iterable[str]) -> Set[str]:
+        """Normalized symbols for a subscription; raises ValueError for too many or no symbols"""
+        symbols = parse_symbols(symbols)
+        if not symbols:
+            raise ValueError("At least one symbol is required")
+        if len(symbols) > self.max_symbols:
+            raise ValueError(f"At most {self.max_symbols} symbols per subscription")
+        return symbols
+
+    def subscribe(self, symbols: Iterable[str], max_queue: Optional[int] = None) -> Subscription:
+        """Register a new subscription; raises ValueError for too many or no symbols"""
+        subscription = Subscription(max_queue)
+        self.update(subscription, add=self.validate(symbols))
+        self._ensure_consumer()
+        return subscription
+
+    def update(self, subscription: Subscription, add: Iterable[str] = (), remove: Iterable[str] = ()) -> None:
+        """Change the symbols of a subscription"""
+        add, remove = parse_symbols(add), parse_symbols(remove)
+        symbols = (subscription.symbols | add) - remove
+        if len(symbols) > self.max_symbols:
+            raise ValueError(f"At most {self.max_symbols} symbols per subscription")
+
+        for symbol in subscription.symbols - symbols:
+            self._discard(symbol, subscription)
+        for symbol in symbols - subscription.symbols:
+            self._subscribers[symbol].add(subscription)
+        subscription.symbols = symbols
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for symbol in subscription.symbols:
+            self._discard(symbol, subscription)
+        subscription.symbols = set()
+
+    def _discard(self, symbol: str, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(symbol)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[symbol]
+
+    def publish(self, events: List[Dict[str, Any]]) -> None:
+        """Push decoded price events to their subscribers; runs on the event loop"""
+        for event in events:
+            subscribers = self._subscribers.get(event["symbol"])
+            if not subscribers:
+                continue
+            frame = json.dumps(
+                {
+                    "symbol": event["symbol"],
+                    "price": event["price"],
+                    "timestamp": event["timestamp"].isoformat() + "Z",
+                    "provider": event["source"],
+                }
+            )
+            for subscription in subscribers:
+                subscription.push(frame)
+            self.published += 1
+
+    def _ensure_consumer(self) -> None:
+        if self._thread is None:
+            self._loop = asyncio.get_running_loop()
+            self._thread = threading.Thread(target=self._consume_loop, name="live-price-consumer", daemon=True)
+            self._thread.start()
+
+    def _consume_loop(self) -> None:
+        """Run the consumer until the hub is closed, starting a new one if it fails"""
+        try:
+            while not self._closing.is_set():
+                try:
+                    self._consume()
+                except Exception as e:
+                    logger.error(f"Live consumer failed, restarting: {e}")
+                    self._closing.wait(1.0)
+        finally:
+            # Lets the next subscription start a consumer if this thread ever exits
+            self._thread = None
+
+    def _consume(self) -> None:
+        """Read price events and hand each batch to the event loop"""
+        loop = self._loop
+        if loop is None:
+            raise RuntimeError("Price hub consumer started outside an event loop")
+        consumer = self.consumer_factory()
+        try:
+            consumer.subscribe([settings.kafka_topic_price_events])
+            while not self._closing.is_set():
+                events = []
+                for msg in consumer.consume(num_messages=500, timeout=0.5):
+                    if msg.error():
+                        if msg.error().code() != KafkaError._PARTITION_EOF:
+                            logger.error(f"Live consumer error: {msg.error()}")
+                        continue
+                    try:
+                        events.append(decode_price_event(msg.value(), msg.headers()))
+                    except Exception as e:
+                        logger.warning(f"Skipping malformed price event: {e}")
+
+                if events:
+                    try:
+                        loop.call_soon_threadsafe(self.publish, events)
+                    except RuntimeError:
+                        # The event loop has been closed; nobody is left to publish to
+                        self._closing.set()
+        finally:
+            consumer.close()
+
+    async def close(self) -> None:
+        """Stop the consumer thread"""
+        self._closing.set()
+        thread = self._thread
+        if thread is not None:
+            await asyncio.to_thread(thread.join)
+        logger.info(f"Price hub closed: {self.published} events published")
@@ -1,20 +1,30 @@
 """Market data providers package"""
 
+from typing import Dict, Optional, Tuple
+
 from .base import MarketDataProvider
 from .yahoo_finance import YahooFinanceProvider
 from .finnhub import FinnhubProvider
+from .rate_limit import RateLimitExceeded, create_rate_limiter
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .composite import CompositeProvider
+from app.core.config import settings
 
 # Provider registry - Use Finnhub as default
 PROVIDERS = {
     "yahoo_finance": YahooFinanceProvider,
     "finnhub": FinnhubProvider,
+    "composite": CompositeProvider,
 }
 
 DEFAULT_PROVIDER = "finnhub"  # Switch to Finnhub for real-time data
 
+# Provider instances are reused so their connection pools stay warm
+_instances: Dict[Tuple[str, Optional[str]], MarketDataProvider] = {}
+
 
-def get_provider(provider_name: str = None, api_key: str = None) -> MarketDataProvider:
-    """Factory function to get a market data provider"""
+def get_provider(provider_name: Optional[str] = None, api_key: Optional[str] = None) -> MarketDataProvider:
+    """Factory function to get a cached market data provider"""
     if not provider_name:
         provider_name = DEFAULT_PROVIDER
 
@@ -22,12 +32,42 @@ def get_provider(provider_name: str = None, api_key: str = None) -> MarketDataPr
         available = ", ".join(PROVIDERS.keys())
         raise ValueError(f"Unknown provider: {provider_name}. Available: {available}")
 
+    key = (provider_name, api_key)
+    provider = _instances.get(key)
+    if provider is not None:
+        return provider
+
     provider_class = PROVIDERS[provider_name]
 
+    if provider_name == "composite":
+        # Members keep their own rate limiters and circuit breakers
+        members = [
+            get_provider(name.strip(), settings.finnhub_api_key if name.strip() == "finnhub" else None)
+            for name in settings.composite_providers.split(",")
+            if name.strip() and name.strip() != "composite"
+        ]
+        _instances[key] = provider = provider_class(members)
+        return provider
+
     if provider_name == "finnhub":
-        return provider_class(api_key or "demo")
+        provider = provider_class(api_key or "demo")
     else:
-        return provider_class()
+        provider = provider_class()
+
+    provider.rate_limiter = create_rate_limiter(provider_name, api_key, provider.get_rate_limit())
+    provider.circuit_breaker = CircuitBreaker(provider_name)
+    _instances[key] = provider
+    return provider
+
+
+async def close_providers() -> None:
+    """Close all cached providers and their connection pools"""
+    providers = list(_instances.values())
+    _instances.clear()
+    for provider in providers:
+        await provider.aclose()
+        if provider.rate_limiter:
+            await provider.rate_limiter.close()
 
 
 def get_available_providers() -> list:
@@ -38,7 +78,12 @@ __all__ = [
     "MarketDataProvider",
     "YahooFinanceProvider",
     "FinnhubProvider",
+    "CompositeProvider",
+    "RateLimitExceeded",
+    "CircuitBreaker",
+    "CircuitOpenError",
     "get_provider",
+    "close_providers",
     "get_available_providers",
     "PROVIDERS",
     "DEFAULT_PROVIDER",
@@ -1,19 +1,161 @@
+import asyncio
+import logging
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar, Union
 from datetime import datetime
+from app.core.config import settings
+from .circuit_breaker import CircuitOpenError
+from .rate_limit import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 
 class MarketDataProvider(ABC):
     """Base interface for market data providers"""
 
+    # Symbols per upstream call in get_latest_prices; providers with a bulk API raise it
+    max_batch_symbols = 1
+
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key
+        # Attached by get_provider
+        self.rate_limiter = None
+        self.circuit_breaker = None
+
+    async def _guarded(self, call: Callable[[], Awaitable[T]], budget: Optional[float] = None) -> T:
+        """Make one upstream call through the circuit breaker, rate limiter and latency budget"""
+        if self.circuit_breaker and not self.circuit_breaker.allow():
+            raise CircuitOpenError(f"{self.get_provider_name()} circuit is open")
+
+        if self.rate_limiter:
+            try:
+                await self.rate_limiter.acquire(settings.rate_limit_timeout)
+            except BaseException:
+                # Rate limited or cancelled before reaching the provider; give back the trial slot
+                if self.circuit_breaker:
+                    self.circuit_breaker.release()
+                raise
+
+        started = time.monotonic()
+        success = False
+        cancelled = False
+        try:
+            result = await asyncio.wait_for(call(), budget or settings.provider_latency_budget)
+            success = True
+            return result
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{self.get_provider_name()} did not answer within its latency budget")
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            if self.circuit_breaker:
+                if cancelled:
+                    # Cancelled by the caller (e.g. a hedge that lost), not a provider failure
+                    self.circuit_breaker.release()
+                else:
+                    self.circuit_breaker.record(success, time.monotonic() - started)
+
+    async def fetch_latest_price(self, symbol: str, budget: Optional[float] = None, fallback: bool = True) -> Dict[str, Any]:
+        """Get the latest price for a symbol through the provider's guards
+
+        Waits for the rate limit, rejects the call while the circuit is open and
+        cancels the upstream call once it exceeds its latency budget. When the
+        call is rejected or fails, the provider's fallback is used if it has one
+        and fallback is true; otherwise the error is raised.
+        """
+        try:
+            return await self._guarded(lambda: self.get_latest_price(symbol), budget)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            if not fallback:
+                raise
+            return self._fallback(symbol, e)
+
+    async def fetch_latest_prices(
+        self, symbols: List[str], budget: Optional[float] = None, fallback: bool = True
+    ) -> Dict[str, Union[Dict[str, Any], BaseException]]:
+        """Get the latest prices for several symbols through the provider's guards
+
+        Symbols are split into chunks of max_batch_symbols, each one guarded
+        upstream call, and up to BATCH_FETCH_CONCURRENCY chunks run at once.
+        Returns the price data, or the error, for every symbol.
+        """
+        symbols = [symbol.upper() for symbol in symbols]
+        chunks = [symbols[i : i + self.max_batch_symbols] for i in range(0, len(symbols), self.max_batch_symbols)]
+        semaphore = asyncio.Semaphore(settings.batch_fetch_concurrency)
+
+        async def fetch_chunk(chunk: List[str]) -> Dict[str, Dict[str, Any]]:
+            async with semaphore:
+                return await self._guarded(lambda: self.get_latest_prices(chunk), budget)
+
+        outcomes = await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks), return_exceptions=True)
+
+        results: Dict[str, Union[Dict[str, Any], BaseException]] = {}
+        error: BaseException
+        for chunk, outcome in zip(chunks, outcomes):
+            for symbol in chunk:
+                if isinstance(outcome, BaseException):
+                    error = outcome
+                elif symbol in outcome:
+                    results[symbol] = outcome[symbol]
+                    continue
+                else:
+                    error = LookupError(f"No price data for {symbol}")
+
+                # Cancellation is not a provider failure, so it gets no fallback
+                if fallback and isinstance(error, Exception) and not isinstance(error, RateLimitExceeded):
+                    try:
+                        results[symbol] = self._fallback(symbol, error)
+                        continue
+                    except Exception as e:
+                        error = e
+                results[symbol] = error
+        return results
+
+    def _fallback(self, symbol: str, error: Exception) -> Dict[str, Any]:
+        fallback = self.get_fallback_price(symbol, str(error)) if settings.provider_mock_fallback else None
+        if fallback is None:
+            raise error
+        return fallback
+
+    def get_fallback_price(self, symbol: str, reason: str) -> Optional[Dict[str, Any]]:
+        """Price to serve when the provider fails, or None to raise the error"""
+        return None
 
     @abstractmethod
     async def get_latest_price(self, symbol: str) -> Dict[str, Any]:
         """Get the latest price for a symbol"""
         pass
 
+    async def get_latest_prices(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the latest prices for several symbols, keyed by upper-case symbol
+
+        Symbols that could not be fetched are left out. The default calls
+        get_latest_price for each symbol concurrently; providers with a bulk
+        API override it.
+        """
+        outcomes = await asyncio.gather(*(self.get_latest_price(symbol) for symbol in symbols), return_exceptions=True)
+
+        prices: Dict[str, Dict[str, Any]] = {}
+        errors: List[BaseException] = []
+        for symbol, outcome in zip(symbols, outcomes):
+            # BaseException, so a cancelled call is an error rather than a price
+            if isinstance(outcome, BaseException):
+                logger.warning(f"{self.get_provider_name()} failed for {symbol}: {outcome}")
+                errors.append(outcome)
+                continue
+            prices[symbol.upper()] = outcome
+
+        # Nothing came back: fail the call so the circuit breaker sees it
+        if errors and not prices:
+            raise errors[0]
+        return prices
+
     @abstractmethod
     def get_provider_name(self) -> str:
         """Get the provider name"""
@@ -23,3 +165,7 @@ class MarketDataProvider(ABC):
     def get_rate_limit(self) -> int:
         """Get rate limit per minute"""
         pass
+
+    async def aclose(self) -> None:
+        """Release network resources held by the provider"""
+        pass
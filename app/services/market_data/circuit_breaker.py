@@ -0,0 +1,110 @@
+import logging
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a provider call is rejected by an open circuit"""
+
+    pass
+
+
+class CircuitBreaker:
+    """Per-provider circuit breaker with error-rate and latency thresholds
+
+    The breaker looks at the last `window` calls. It opens when the share of
+    failed calls, or of calls slower than `slow_call_seconds`, reaches its
+    threshold. While open, calls are rejected for `open_seconds`. Then a
+    limited number of trial calls are let through (half-open). If all of
+    them succeed the breaker closes again, and any failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: Optional[float] = None,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: Optional[float] = None,
+        window: Optional[int] = None,
+        min_calls: Optional[int] = None,
+        open_seconds: Optional[float] = None,
+        half_open_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate or settings.breaker_failure_rate
+        self.slow_call_seconds = slow_call_seconds or settings.breaker_slow_call_seconds
+        self.slow_call_rate = slow_call_rate or settings.breaker_slow_call_rate
+        self.min_calls = min_calls or settings.breaker_min_calls
+        self.open_seconds = open_seconds or settings.breaker_open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.calls: Deque[Tuple[bool, bool]] = deque(maxlen=window or settings.breaker_window)  # (failed, slow)
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trials = 0
+        self.trial_successes = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go through now"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                return False
+            self._transition(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            if self.trials >= self.half_open_calls:
+                return False
+            self.trials += 1
+
+        return True
+
+    def record(self, success: bool, duration: float) -> None:
+        """Record the outcome of a call that allow() let through"""
+        slow = duration >= self.slow_call_seconds
+
+        if self.state == self.HALF_OPEN:
+            if not success or slow:
+                self._transition(self.OPEN)
+                return
+            self.trial_successes += 1
+            if self.trial_successes >= self.half_open_calls:
+                self._transition(self.CLOSED)
+            return
+
+        self.calls.append((not success, slow))
+        if len(self.calls) < self.min_calls:
+            return
+
+        failures = sum(1 for failed, _ in self.calls if failed) / len(self.calls)
+        slow_calls = sum(1 for _, was_slow in self.calls if was_slow) / len(self.calls)
+        if failures >= self.failure_rate or slow_calls >= self.slow_call_rate:
+            logger.warning(
+                f"Opening circuit for {self.name}: {failures:.0%} failed, {slow_calls:.0%} slow "
+                f"over the last {len(self.calls)} calls"
+            )
+            self._transition(self.OPEN)
+
+    def release(self) -> None:
+        """Return a call that allow() let through but that never completed"""
+        if self.state == self.HALF_OPEN and self.trials > 0:
+            self.trials -= 1
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            logger.info(f"Circuit for {self.name}: {self.state} -> {state}")
+        self.state = state
+        self.trials = 0
+        self.trial_successes = 0
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+        elif state == self.CLOSED:
+            self.calls.clear()
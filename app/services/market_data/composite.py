@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, cast
+
+from app.core.config import settings
+from .base import MarketDataProvider
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderStats:
+    """Rolling latency and error statistics for one provider"""
+
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)  # successful calls only
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+
+    def record(self, success: bool, latency: float) -> None:
+        self.outcomes.append(success)
+        if success:
+            self.latencies.append(latency)
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def score(self) -> float:
+        """Expected cost of a call; lower is better"""
+        median = self.percentile(0.5)
+        if median is None:
+            # Try unmeasured providers first so they get measured; never-successful ones last
+            return float("inf") if self.outcomes else 0.0
+        return median / max(1.0 - self.error_rate(), 0.05)
+
+
+class CompositeProvider(MarketDataProvider):
+    """Fetch from several providers, ranked by rolling latency and errors
+
+    The best-ranked provider is called first. If it has not answered within
+    its p95 latency, a hedged request goes to the next provider, and a failed
+    or invalid answer moves on to the next provider right away. The first
+    valid price wins and the calls still running are cancelled.
+    """
+
+    def __init__(self, providers: List[MarketDataProvider]):
+        super().__init__()
+        self.providers = providers
+        self.stats = {provider.get_provider_name(): ProviderStats(settings.composite_stats_window) for provider in providers}
+
+    def ranked(self) -> List[MarketDataProvider]:
+        """Providers in the order they should be tried"""
+
+        def key(provider: MarketDataProvider) -> Tuple[bool, float]:
+            breaker = provider.circuit_breaker
+            circuit_open = breaker is not None and breaker.state == breaker.OPEN
+            return circuit_open, self.stats[provider.get_provider_name()].score()
+
+        return sorted(self.providers, key=key)
+
+    def hedge_delay(self, provider: MarketDataProvider) -> float:
+        """How long to wait for a provider before hedging to the next one"""
+        stats = self.stats[provider.get_provider_name()]
+        p95 = stats.percentile(0.95)
+        if p95 is None or len(stats.latencies) < settings.composite_min_samples:
+            return settings.composite_hedge_delay
+        return max(p95, settings.composite_min_hedge_delay)
+
+    @staticmethod
+    def is_valid(price_data: Dict[str, Any]) -> bool:
+        price = price_data.get("price")
+        if not isinstance(price, (int, float)) or price <= 0:
+            return False
+        return not price_data.get("raw_response", {}).get("mock", False)
+
+    async def _call(self, provider: MarketDataProvider, symbol: str, budget: Optional[float]) -> Dict[str, Any]:
+        started = time.monotonic()
+        stats = self.stats[provider.get_provider_name()]
+        try:
+            price_data = await provider.fetch_latest_price(symbol, budget, fallback=False)
+        except asyncio.CancelledError:
+            raise  # a hedge that lost says nothing about the provider
+        except Exception:
+            stats.record(False, time.monotonic() - started)
+            raise
+
+        valid = self.is_valid(price_data)
+        stats.record(valid, time.monotonic() - started)
+        if not valid:
+            raise ValueError(f"{provider.get_provider_name()} returned no valid price for {symbol}")
+        return price_data
+
+    async def fetch_latest_price(self, symbol: str, budget: Optional[float] = None, fallback: bool = True) -> Dict[str, Any]:
+        """Get the first valid price from the ranked providers, hedging slow calls"""
+        deadline = time.monotonic() + (budget or settings.provider_latency_budget)
+        candidates = self.ranked()
+        pending: Dict["asyncio.Task[Dict[str, Any]]", MarketDataProvider] = {}
+        error: Exception = LookupError(f"No provider returned a price for {symbol}")
+
+        def launch() -> float:
+            provider = candidates.pop(0)
+            task = asyncio.ensure_future(self._call(provider, symbol, max(deadline - time.monotonic(), 0.001)))
+            pending[task] = provider
+            return time.monotonic() + self.hedge_delay(provider)
+
+        next_hedge = launch()
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    error = TimeoutError(f"No provider answered for {symbol} within the latency budget")
+                    break
+
+                timeout = deadline - now
+                if candidates:
+                    timeout = min(timeout, max(next_hedge - now, 0.0))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    if candidates and time.monotonic() >= next_hedge:
+                        logger.debug(f"Hedging {symbol} to {candidates[0].get_provider_name()}")
+                        next_hedge = launch()
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    exception = task.exception()
+                    if exception is None:
+                        return task.result()
+                    error = cast(Exception, exception)
+                    logger.warning(f"{provider.get_provider_name()} failed for {symbol}: {error}")
+
+                # A failed call is replaced right away instead of waiting for the hedge delay
+                if candidates:
+                    next_hedge = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if not fallback:
+            raise error
+        return self._fallback(symbol, error)
+
+    def get_fallback_price(self, symbol: str, reason: str) -> Optional[Dict[str, Any]]:
+        for provider in self.providers:
+            price_data = provider.get_fallback_price(symbol, reason)
+            if price_data is not None:
+                return price_data
+        return None
+
+    async def get_latest_price(self, symbol: str) -> Dict[str, Any]:
+        return await self.fetch_latest_price(symbol, fallback=False)
+
+    def get_provider_name(self) -> str:
+        return "composite"
+
+    def get_rate_limit(self) -> int:
+        return sum(provider.get_rate_limit() for provider in self.providers)
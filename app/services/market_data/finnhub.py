@@ -1,7 +1,9 @@
 import httpx
+import importlib.util
 import random
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
+from app.core.config import settings
 from .base import MarketDataProvider
 import logging
 
@@ -11,18 +13,46 @@ logger = logging.getLogger(__name__)
 class FinnhubProvider(MarketDataProvider):
     """Finnhub provider for REAL-TIME market data"""
 
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: Optional[str] = None) -> None:
         super().__init__(api_key)
         if not api_key or api_key == "demo":
             raise ValueError("Finnhub requires a valid API key for real-time data")
 
         self.api_key = api_key
         self.base_url = "https://finnhub.io/api/v1"
+        self._client: Optional[httpx.AsyncClient] = None
 
         # Log with masked API key for security
         masked_key = f"{api_key[:8]}...{api_key[-4:]}" if len(api_key) > 12 else "***"
         logger.info(f"✅ Initialized Finnhub with API key: {masked_key}")
 
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the shared keep-alive HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            http2 = settings.provider_http2
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("PROVIDER_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+                http2 = False
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=settings.provider_http_timeout,
+                headers={"User-Agent": "Market-Data-Service/1.0", "Accept": "application/json"},
+                limits=httpx.Limits(
+                    max_connections=settings.provider_http_max_connections,
+                    max_keepalive_connections=settings.provider_http_max_keepalive,
+                    keepalive_expiry=settings.provider_http_keepalive_expiry,
+                ),
+                http2=http2,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the HTTP connection pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
     async def get_latest_price(self, symbol: str) -> Dict[str, Any]:
         """Get REAL-TIME price from Finnhub API"""
         try:
@@ -30,14 +60,11 @@ class FinnhubProvider(MarketDataProvider):
 
             params = {"symbol": symbol.upper(), "token": self.api_key}
 
-            headers = {"User-Agent": "Market-Data-Service/1.0", "Accept": "application/json"}
-
-            async with httpx.AsyncClient(timeout=15.0, headers=headers) as client:
-                response = await client.get(f"{self.base_url}/quote", params=params)
+            response = await self._get_client().get("/quote", params=params)
 
-                logger.info(f"Finnhub API response: {response.status_code}")
-                response.raise_for_status()
-                data = response.json()
+            logger.info(f"Finnhub API response: {response.status_code}")
+            response.raise_for_status()
+            data = response.json()
 
             # Check for valid price data
             current_price = data.get("c")
@@ -79,8 +106,9 @@ class FinnhubProvider(MarketDataProvider):
             }
 
         except Exception as e:
+            # Raised so the circuit breaker sees it; fetch_latest_price falls back to mock data
             logger.error(f"❌ Finnhub error for {symbol}: {e}")
-            return self._get_mock_data(symbol, f"error_{e}")
+            raise
 
     def _get_mock_data(self, symbol: str, reason: str = "unknown") -> Dict[str, Any]:
         """Fallback mock data"""
@@ -108,6 +136,9 @@ class FinnhubProvider(MarketDataProvider):
             "raw_response": {"source": "mock_data", "mock": True, "mock_reason": reason},
         }
 
+    def get_fallback_price(self, symbol: str, reason: str) -> Dict[str, Any]:
+        return self._get_mock_data(symbol, f"error_{reason}")
+
     def get_provider_name(self) -> str:
         return "finnhub"
 
@@ -1,6 +1,6 @@
 from .base import MarketDataProvider
 from .yahoo_finance import YahooFinanceProvider
-from typing import Dict, Type
+from typing import Dict, Optional, Type
 
 # Simplified provider registry - only Yahoo Finance
 PROVIDERS: Dict[str, Type[MarketDataProvider]] = {
@@ -11,7 +11,7 @@ PROVIDERS: Dict[str, Type[MarketDataProvider]] = {
 DEFAULT_PROVIDER = "yahoo_finance"
 
 
-def get_provider(provider_name: str = None, api_key: str = None) -> MarketDataProvider:
+def get_provider(provider_name: Optional[str] = None, api_key: Optional[str] = None) -> MarketDataProvider:
     """Factory function to get a market data provider"""
     # Use default if no provider specified
     if not provider_name:
@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Optional, Union
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot get a token before its deadline"""
+
+    pass
+
+
+class TokenBucket:
+    """In-process token bucket
+
+    Callers that find the bucket empty reserve a future token and sleep until
+    it is due, so waiting callers are served in arrival order. A caller whose
+    wait would exceed its timeout gets RateLimitExceeded without reserving.
+    """
+
+    def __init__(self, rate_per_minute: int, burst: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0  # tokens per second
+        self.capacity = max(1.0, burst if burst is not None else self.rate * settings.rate_limit_burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _reserve(self, timeout: Optional[float]) -> float:
+        """Take a token, returning how long to wait until it is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if timeout is not None and wait > timeout:
+            raise RateLimitExceeded(f"Rate limit wait of {wait:.1f}s exceeds {timeout:.1f}s")
+
+        self.tokens -= 1
+        return wait
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        """Wait for a token, for at most timeout seconds"""
+        wait = self._reserve(timeout)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def close(self) -> None:
+        pass
+
+
+# Same reservation logic as TokenBucket, run atomically in Redis on the server clock
+_REDIS_RESERVE = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local wait = math.max(0, (1 - tokens) / rate)
+if max_wait >= 0 and wait > max_wait then
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    return {0, tostring(wait)}
+end
+
+tokens = tokens - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return {1, tostring(wait)}
+"""
+
+
+class RedisTokenBucket:
+    """Token bucket shared by all workers through Redis
+
+    Falls back to a local bucket if Redis is unavailable.
+    """
+
+    def __init__(self, key: str, rate_per_minute: int, burst: Optional[float] = None, redis_url: Optional[str] = None):
+        self.key = key
+        self.local = TokenBucket(rate_per_minute, burst)
+        self.redis = redis.from_url(redis_url or settings.redis_url)
+        self.script = self.redis.register_script(_REDIS_RESERVE)
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        """Wait for a token, for at most timeout seconds"""
+        try:
+            reserved, wait = await self.script(
+                keys=[self.key], args=[self.local.rate, self.local.capacity, -1 if timeout is None else timeout]
+            )
+        except RedisError as e:
+            logger.warning(f"Redis rate limiter unavailable, using local limit: {e}")
+            await self.local.acquire(timeout)
+            return
+
+        wait = float(wait)
+        if not reserved:
+            raise RateLimitExceeded(f"Rate limit wait of {wait:.1f}s exceeds {timeout:.1f}s")
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def create_rate_limiter(
+    provider_name: str, api_key: Optional[str], rate_per_minute: int
+) -> Union[TokenBucket, RedisTokenBucket]:
+    """Create the configured rate limiter for a provider and API key"""
+    if settings.rate_limit_backend == "redis":
+        # Quotas are per key, but the key itself is not stored in Redis
+        key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        return RedisTokenBucket(f"ratelimit:{provider_name}:{key_hash}", rate_per_minute)
+    return TokenBucket(rate_per_minute)
@@ -1,27 +1,48 @@
 import yfinance as yf
 import asyncio
-from typing import Dict, Any
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime
+from app.core.config import settings
 from .base import MarketDataProvider
 import logging
 
 logger = logging.getLogger(__name__)
 
+# A lookup method run in the thread pool: (ticker, symbol) -> price data or None
+Approach = Callable[[yf.Ticker, str], Optional[Dict[str, Any]]]
+
+# yf.download collects results in module-level state, so downloads must not overlap
+_download_lock = threading.Lock()
+
 
 class YahooFinanceProvider(MarketDataProvider):
     """Yahoo Finance provider implementation using yfinance"""
 
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: Optional[str] = None) -> None:
         super().__init__(api_key)
         # Configure yfinance with proper headers
-        self.session = None
+        self.session: Any = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.max_batch_symbols = settings.yahoo_batch_symbols
+        # Approach that last returned a price, per symbol
+        self.winners: Dict[str, str] = {}
 
-    def _get_session(self):
+    def _get_session(self) -> Any:
         """Get configured session for yfinance"""
         if not self.session:
             import requests
+            from requests.adapters import HTTPAdapter
 
             self.session = requests.Session()
+            # yfinance runs in executor threads, so size the pool for concurrent fetches
+            adapter = HTTPAdapter(
+                pool_connections=settings.provider_http_max_keepalive, pool_maxsize=settings.provider_http_max_keepalive
+            )
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
             self.session.headers.update(
                 {
                     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
@@ -29,27 +50,39 @@ class YahooFinanceProvider(MarketDataProvider):
             )
         return self.session
 
+    async def aclose(self) -> None:
+        """Close the HTTP session and the thread pool"""
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.session:
+            self.session.close()
+            self.session = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Bounded thread pool for blocking yfinance calls"""
+        if not self.executor:
+            self.executor = ThreadPoolExecutor(max_workers=settings.yahoo_executor_threads, thread_name_prefix="yahoo")
+        return self.executor
+
+    def _ordered_approaches(self, symbol: str) -> List[Approach]:
+        """Approaches to try, starting with the one that last won for this symbol"""
+        approaches = [self._try_fast_info, self._try_regular_info, self._try_history_method]
+        winner = self.winners.get(symbol.upper())
+        return sorted(approaches, key=lambda approach: approach.__name__ != winner)
+
     async def get_latest_price(self, symbol: str) -> Dict[str, Any]:
         """Get latest price from Yahoo Finance with better error handling"""
         try:
-            loop = asyncio.get_event_loop()
-
-            # Try different approaches in order
-            approaches = [
-                self._try_fast_info,
-                self._try_regular_info,
-                self._try_history_method,
-                self._try_mock_data,  # Fallback for demo
-            ]
-
-            for approach in approaches:
-                try:
-                    result = await loop.run_in_executor(None, approach, symbol)
-                    if result:
-                        return result
-                except Exception as e:
-                    logger.warning(f"Approach {approach.__name__} failed for {symbol}: {e}")
-                    continue
+            ticker = yf.Ticker(symbol, session=self._get_session())
+            approaches = self._ordered_approaches(symbol)
+
+            if settings.yahoo_fetch_mode == "race":
+                result = await self._race(approaches, ticker, symbol)
+            else:
+                result = await self._sequential(approaches, ticker, symbol)
+            if result:
+                return result
 
             raise Exception(f"All methods failed for symbol {symbol}")
 
@@ -57,9 +90,110 @@ class YahooFinanceProvider(MarketDataProvider):
             logger.error(f"Failed to fetch data for {symbol}: {str(e)}")
             raise Exception(f"Failed to fetch data for {symbol}: {str(e)}")
 
-    def _try_fast_info(self, symbol: str) -> Dict[str, Any]:
+    async def _sequential(self, approaches: List[Approach], ticker: yf.Ticker, symbol: str) -> Optional[Dict[str, Any]]:
+        """Try the approaches one after another"""
+        loop = asyncio.get_event_loop()
+        for approach in approaches:
+            try:
+                result = await loop.run_in_executor(self._get_executor(), approach, ticker, symbol)
+                if result:
+                    self.winners[symbol.upper()] = approach.__name__
+                    return result
+            except Exception as e:
+                logger.warning(f"Approach {approach.__name__} failed for {symbol}: {e}")
+        return None
+
+    async def _race(self, approaches: List[Approach], ticker: yf.Ticker, symbol: str) -> Optional[Dict[str, Any]]:
+        """Run the approaches concurrently and return the first valid price
+
+        When an approach is known to win for this symbol it gets a head start,
+        and the others only start if it has not answered by then. Approaches
+        still queued when a price arrives are cancelled; running ones are left
+        to finish in their thread and ignored.
+        """
+        loop = asyncio.get_event_loop()
+        executor = self._get_executor()
+        pending: Dict[asyncio.Future, str] = {}
+
+        def start(approach: Approach) -> None:
+            pending[loop.run_in_executor(executor, approach, ticker, symbol)] = approach.__name__
+
+        waiting = list(approaches)
+        head_start = None
+        if symbol.upper() in self.winners:
+            start(waiting.pop(0))
+            head_start = settings.yahoo_race_head_start
+        else:
+            while waiting:
+                start(waiting.pop(0))
+
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=head_start if waiting else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done or any(future.exception() is not None or not future.result() for future in done):
+                    # The head start ran out or an approach came back empty: start the rest
+                    while waiting:
+                        start(waiting.pop(0))
+
+                for future in done:
+                    name = pending.pop(future)
+                    if future.exception() is not None:
+                        logger.warning(f"Approach {name} failed for {symbol}: {future.exception()}")
+                    elif future.result():
+                        self.winners[symbol.upper()] = name
+                        price: Dict[str, Any] = future.result()
+                        return price
+            return None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def get_latest_prices(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get latest prices for many symbols with one bulk download"""
+        if len(symbols) == 1:
+            return {symbols[0].upper(): await self.get_latest_price(symbols[0])}
+
+        loop = asyncio.get_event_loop()
+        prices = await loop.run_in_executor(
+            self._get_executor(), self._download_prices, [symbol.upper() for symbol in symbols]
+        )
+        if not prices:
+            raise Exception(f"Bulk download returned no prices for {len(symbols)} symbols")
+        return prices
+
+    def _download_prices(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Download recent daily bars for all symbols and take each last close"""
+        with _download_lock:
+            data = yf.download(
+                symbols,
+                period="5d",
+                interval="1d",
+                group_by="ticker",
+                progress=False,
+                session=self._get_session(),
+            )
+
+        prices = {}
+        timestamp = datetime.utcnow().isoformat() + "Z"
+        for symbol in symbols:
+            if data.empty or symbol not in data.columns.get_level_values(0):
+                continue
+            closes = data[symbol]["Close"].dropna()
+            if closes.empty or not math.isfinite(closes.iloc[-1]) or closes.iloc[-1] <= 0:
+                continue
+            prices[symbol] = {
+                "symbol": symbol,
+                "price": float(closes.iloc[-1]),
+                "timestamp": timestamp,
+                "provider": self.get_provider_name(),
+                "raw_response": {"close": float(closes.iloc[-1]), "date": closes.index[-1].isoformat(), "method": "download"},
+            }
+        return prices
+
+    def _try_fast_info(self, ticker: yf.Ticker, symbol: str) -> Optional[Dict[str, Any]]:
         """Try using fast_info method"""
-        ticker = yf.Ticker(symbol, session=self._get_session())
         fast_info = ticker.fast_info
         price = fast_info.get("lastPrice") or fast_info.get("regularMarketPrice")
 
@@ -74,9 +208,8 @@ class YahooFinanceProvider(MarketDataProvider):
             }
         return None
 
-    def _try_regular_info(self, symbol: str) -> Dict[str, Any]:
+    def _try_regular_info(self, ticker: yf.Ticker, symbol: str) -> Optional[Dict[str, Any]]:
         """Try using regular info method"""
-        ticker = yf.Ticker(symbol, session=self._get_session())
         info = ticker.info
         price = info.get("regularMarketPrice") or info.get("currentPrice") or info.get("previousClose")
 
@@ -91,9 +224,8 @@ class YahooFinanceProvider(MarketDataProvider):
             }
         return None
 
-    def _try_history_method(self, symbol: str) -> Dict[str, Any]:
+    def _try_history_method(self, ticker: yf.Ticker, symbol: str) -> Optional[Dict[str, Any]]:
         """Try using history method"""
-        ticker = yf.Ticker(symbol, session=self._get_session())
         hist = ticker.history(period="5d", interval="1d")
 
         if not hist.empty:
@@ -139,6 +271,9 @@ class YahooFinanceProvider(MarketDataProvider):
             "raw_response": {"mock": True, "base_price": base_price, "method": "mock"},
         }
 
+    def get_fallback_price(self, symbol: str, reason: str) -> Dict[str, Any]:
+        return self._try_mock_data(symbol)  # Fallback for demo
+
     def get_provider_name(self) -> str:
         return "yahoo_finance"
 
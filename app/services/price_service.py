@@ -1,73 +1,214 @@
+import asyncio
 import json
 import uuid
-from typing import Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from datetime import datetime
+import numpy as np
+from typing import Any, Dict, Optional, List, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, func, insert, select
+from datetime import datetime, timedelta, timezone
 
-from app.models.price import RawMarketData, ProcessedPrice, MovingAverage, PollingJob
-from app.services.market_data import get_provider
+from app.models.price import RawMarketData, ProcessedPrice, MovingAverage, LatestPrice, LatestMovingAverage, PollingJob
+from app.services.market_data import MarketDataProvider, get_provider
 from app.services.kafka.producer import PriceEventProducer
+from app.services.kafka.indicators import EMA, SMA, ema, precomputed_windows
+from app.services.cache import PriceCache
+from app.services.singleflight import SingleFlight
+from app.services.write_behind import RawDataWriter
 from app.core.config import settings
+from app.core.database import time_bucket
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# Bucket widths accepted by get_price_history, in seconds
+HISTORY_BUCKETS = {"1m": 60, "5m": 300, "1h": 3600}
+
+
 class PriceService:
     """Service class for handling price-related operations"""
 
-    def __init__(self):
-        self.producer = PriceEventProducer()
+    def __init__(
+        self,
+        producer: Optional[PriceEventProducer] = None,
+        cache: Optional[PriceCache] = None,
+        raw_writer: Optional[RawDataWriter] = None,
+    ):
+        self.producer = producer or PriceEventProducer()
+        self.cache = cache
+        # With a writer, raw rows are inserted in the background instead of on the request path
+        self.raw_writer = raw_writer
+        # Concurrent fetches of the same (provider, symbol) share one provider call
+        self.flights = SingleFlight(max_waiters=settings.singleflight_max_waiters, timeout=settings.singleflight_timeout)
+
+    async def close(self) -> None:
+        """Flush buffered raw rows and Kafka events and release the producer and cache"""
+        if self.raw_writer:
+            await self.raw_writer.close()
+        self.producer.close()
+        if self.cache:
+            await self.cache.close()
+
+    def _get_provider(self, provider_name: str) -> MarketDataProvider:
+        """Get the provider instance for a provider name"""
+        # Get API key for provider if needed
+        api_key = None
+        if provider_name == "alpha_vantage":
+            api_key = settings.alpha_vantage_api_key
+        elif provider_name == "finnhub":
+            api_key = settings.finnhub_api_key
+
+        return get_provider(provider_name, api_key)
+
+    async def _fetch(self, provider_name: str, provider: MarketDataProvider, symbol: str) -> Tuple[Dict[str, Any], bool]:
+        """Fetch price data, joining an identical fetch that is already in flight"""
+        return await self.flights.do((provider_name, symbol.upper()), lambda: provider.fetch_latest_price(symbol))
+
+    @staticmethod
+    def _raw_row(price_data: Dict[str, Any], provider_name: str) -> Dict[str, Any]:
+        """raw_market_data row for fetched price data, with its ID assigned up front"""
+        return {
+            "id": uuid.uuid4(),
+            "symbol": price_data["symbol"].upper(),
+            "provider": price_data.get("provider", provider_name),
+            "raw_response": json.dumps(price_data.get("raw_response", {})),
+            "timestamp": datetime.utcnow(),
+        }
+
+    async def _store_raw(self, db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+        """Insert raw rows now, or hand them to the write-behind buffer"""
+        if self.raw_writer:
+            await self.raw_writer.add(rows)
+            return
+        await db.execute(insert(RawMarketData), rows)
+        await db.commit()
+
+    @staticmethod
+    def _to_response(price_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "symbol": price_data["symbol"],
+            "price": price_data["price"],
+            "timestamp": price_data["timestamp"],
+            "provider": price_data["provider"],
+        }
 
-    async def get_latest_price(self, db: Session, symbol: str, provider_name: Optional[str] = None) -> dict:
-        """Get the latest price for a symbol"""
+    async def get_latest_price(
+        self, db: AsyncSession, symbol: str, provider_name: Optional[str] = None, max_age: Optional[float] = None
+    ) -> dict:
+        """Get the latest price for a symbol
+
+        A cached price no older than max_age seconds is served without calling
+        the provider.
+        """
         try:
             # Use default provider if not specified
             if not provider_name:
                 provider_name = settings.default_provider
+            if max_age is None:
+                max_age = settings.price_cache_default_max_age
 
-            # Get API key for provider if needed
-            api_key = None
-            if provider_name == "alpha_vantage":
-                api_key = settings.alpha_vantage_api_key
-            elif provider_name == "finnhub":
-                api_key = settings.finnhub_api_key
+            if self.cache:
+                cached = await self.cache.get(provider_name, symbol, max_age)
+                if cached:
+                    return cached
 
-            # Get the provider
-            provider = get_provider(provider_name, api_key)
+            provider = self._get_provider(provider_name)
+            price_data, shared = await self._fetch(provider_name, provider, symbol)
+            response = self._to_response(price_data)
 
-            # Fetch price data
-            price_data = await provider.get_latest_price(symbol)
+            # The caller that made the provider call records it for everyone
+            if shared:
+                return response
 
             # Store raw response
-            raw_data = RawMarketData(
-                symbol=symbol.upper(), provider=provider_name, raw_response=json.dumps(price_data.get("raw_response", {}))
-            )
-            db.add(raw_data)
-            db.commit()
-            db.refresh(raw_data)
+            row = self._raw_row(price_data, provider_name)
+            await self._store_raw(db, [row])
 
             # Add raw_response_id to price_data for Kafka message
-            price_data["raw_response_id"] = raw_data.id
+            price_data["raw_response_id"] = row["id"]
 
             # Produce to Kafka for processing
             await self.producer.produce_price_event(price_data)
 
-            # Return API response
-            return {
-                "symbol": price_data["symbol"],
-                "price": price_data["price"],
-                "timestamp": price_data["timestamp"],
-                "provider": price_data["provider"],
-            }
+            if self.cache:
+                await self.cache.set(provider_name, symbol, response)
+            return response
 
         except Exception as e:
             logger.error(f"Error fetching price for {symbol}: {e}")
             raise
 
+    async def get_latest_prices(
+        self, db: AsyncSession, symbols: List[str], provider_name: Optional[str] = None, max_age: Optional[float] = None
+    ) -> dict:
+        """Get the latest prices for several symbols
+
+        Cache misses are fetched with the provider's batch call, joining fetches
+        of the same symbols that are already in flight. New raw rows are stored
+        with one bulk insert and their events produced as one batch. Each
+        symbol gets either a price or an error.
+        """
+        if not provider_name:
+            provider_name = settings.default_provider
+        if max_age is None:
+            max_age = settings.price_cache_default_max_age
+
+        symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+        outcomes: Dict[str, Any] = {}
+        if self.cache:
+            cached = await asyncio.gather(*(self.cache.get(provider_name, symbol, max_age) for symbol in symbols))
+            outcomes = {symbol: (hit, True) for symbol, hit in zip(symbols, cached) if hit}
+
+        misses = [symbol for symbol in symbols if symbol not in outcomes]
+        if misses:
+            provider = self._get_provider(provider_name)
+
+            async def fetch_bulk(keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Any]:
+                results = await provider.fetch_latest_prices([symbol for _, symbol in keys])
+                return {(provider_name, symbol): result for symbol, result in results.items()}
+
+            # Symbols already being fetched join that fetch; the rest go out in bulk
+            results = await self.flights.do_many([(provider_name, symbol) for symbol in misses], fetch_bulk)
+            outcomes.update(zip(misses, results))
+
+        prices = []
+        errors = []
+        fetched = []
+        for symbol in symbols:
+            outcome = outcomes[symbol]
+            if isinstance(outcome, BaseException):
+                logger.error(f"Error fetching price for {symbol}: {outcome}")
+                errors.append({"symbol": symbol, "detail": str(outcome) or outcome.__class__.__name__})
+                continue
+
+            price_data, shared = outcome
+            prices.append(self._to_response(price_data))
+            if not shared:
+                fetched.append(price_data)
+
+        if fetched:
+            try:
+                # IDs are assigned up front so one bulk insert covers the whole batch
+                rows = [self._raw_row(price_data, provider_name) for price_data in fetched]
+                await self._store_raw(db, rows)
+
+                for price_data, row in zip(fetched, rows):
+                    price_data["raw_response_id"] = row["id"]
+                await self.producer.produce_price_events(fetched)
+
+                if self.cache:
+                    await asyncio.gather(
+                        *(self.cache.set(provider_name, data["symbol"], self._to_response(data)) for data in fetched)
+                    )
+
+            except Exception as e:
+                logger.error(f"Error storing batch of {len(fetched)} prices: {e}")
+                raise
+
+        return {"prices": prices, "errors": errors}
+
     async def create_polling_job(
-        self, db: Session, symbols: List[str], interval: int, provider_name: Optional[str] = None
+        self, db: AsyncSession, symbols: List[str], interval: int, provider_name: Optional[str] = None
     ) -> dict:
         """Create a new polling job"""
         try:
@@ -83,10 +224,9 @@ class PriceService:
                 job_id=job_id, symbols=json.dumps(symbols), interval=interval, provider=provider_name, status="accepted"
             )
             db.add(job)
-            db.commit()
+            await db.commit()
 
-            # TODO: In a real implementation, you'd add this job to a task queue
-            # For now, we'll just return the accepted response
+            # PollingScheduler picks the job up on its next refresh
 
             return {
                 "job_id": job_id,
@@ -98,25 +238,48 @@ class PriceService:
             logger.error(f"Error creating polling job: {e}")
             raise
 
-    def get_moving_average(self, db: Session, symbol: str, window_size: Optional[int] = None) -> Optional[dict]:
-        """Get the latest moving average for a symbol"""
+    async def get_moving_average(
+        self, db: AsyncSession, symbol: str, window_size: Optional[int] = None, kind: str = SMA
+    ) -> Optional[dict]:
+        """Get the latest moving average (SMA or EMA) for a symbol
+
+        For windows the consumer precomputes, reads its latest_moving_averages
+        row by primary key, falling back to the newest moving_averages row.
+        Any other window is calculated from processed_prices on demand, since
+        stored rows of a window dropped from the configuration go stale.
+        """
         try:
             if not window_size:
                 window_size = settings.moving_average_window
+            if kind not in (SMA, EMA):
+                raise ValueError(f"Unknown moving average kind: {kind}")
+            if window_size < 1:
+                raise ValueError("Window size must be at least 1")
 
-            # Get the latest moving average
-            ma = (
-                db.query(MovingAverage)
-                .filter(MovingAverage.symbol == symbol.upper(), MovingAverage.window_size == window_size)
-                .order_by(desc(MovingAverage.timestamp))
-                .first()
-            )
+            symbol = symbol.upper()
+            if window_size not in precomputed_windows()[kind]:
+                # Stored rows of windows no longer precomputed are stale
+                return await self._compute_moving_average(db, symbol, window_size, kind)
+
+            ma = await db.get(LatestMovingAverage, (symbol, kind, window_size))
 
             if not ma:
-                return None
+                result = await db.execute(
+                    select(MovingAverage)
+                    .where(
+                        MovingAverage.symbol == symbol, MovingAverage.kind == kind, MovingAverage.window_size == window_size
+                    )
+                    .order_by(desc(MovingAverage.timestamp))
+                    .limit(1)
+                )
+                ma = result.scalar_one_or_none()
+
+            if not ma:
+                return await self._compute_moving_average(db, symbol, window_size, kind)
 
             return {
                 "symbol": ma.symbol,
+                "kind": ma.kind,
                 "window_size": ma.window_size,
                 "value": ma.value,
                 "timestamp": ma.timestamp.isoformat() + "Z",
@@ -125,3 +288,144 @@ class PriceService:
         except Exception as e:
             logger.error(f"Error getting moving average for {symbol}: {e}")
             raise
+
+    async def _compute_moving_average(self, db: AsyncSession, symbol: str, window_size: int, kind: str) -> Optional[dict]:
+        """Calculate a moving average from processed_prices for a window that is not precomputed"""
+        if window_size > settings.indicator_on_demand_max_window:
+            raise ValueError(f"Window size must be at most {settings.indicator_on_demand_max_window}")
+
+        if kind == SMA:
+            recent = (
+                select(ProcessedPrice.price, ProcessedPrice.timestamp)
+                .where(ProcessedPrice.symbol == symbol)
+                .order_by(desc(ProcessedPrice.timestamp))
+                .limit(window_size)
+                .subquery()
+            )
+            value, timestamp = (await db.execute(select(func.avg(recent.c.price), func.max(recent.c.timestamp)))).one()
+            if value is None:
+                return None
+        else:
+            # Older prices barely affect an EMA; a few windows of history are enough to settle it
+            result = await db.execute(
+                select(ProcessedPrice.price, ProcessedPrice.timestamp)
+                .where(ProcessedPrice.symbol == symbol)
+                .order_by(desc(ProcessedPrice.timestamp))
+                .limit(4 * window_size)
+            )
+            rows = result.all()
+            if not rows:
+                return None
+            value = ema(np.array([row.price for row in reversed(rows)]), window_size)[-1]
+            timestamp = rows[0].timestamp
+
+        return {
+            "symbol": symbol,
+            "kind": kind,
+            "window_size": window_size,
+            "value": float(value),
+            "timestamp": timestamp.isoformat() + "Z",
+        }
+
+    async def get_latest_processed_price(self, db: AsyncSession, symbol: str) -> Optional[dict]:
+        """Get the latest price the consumer has processed for a symbol, without calling a provider"""
+        try:
+            price = await db.get(LatestPrice, symbol.upper())
+
+            if not price:
+                result = await db.execute(
+                    select(ProcessedPrice)
+                    .where(ProcessedPrice.symbol == symbol.upper())
+                    .order_by(desc(ProcessedPrice.timestamp))
+                    .limit(1)
+                )
+                price = result.scalar_one_or_none()
+
+            if not price:
+                return None
+
+            return {
+                "symbol": price.symbol,
+                "price": price.price,
+                "timestamp": price.timestamp.isoformat() + "Z",
+                "provider": price.provider,
+            }
+
+        except Exception as e:
+            logger.error(f"Error getting processed price for {symbol}: {e}")
+            raise
+
+    async def get_price_history(
+        self,
+        db: AsyncSession,
+        symbol: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket: str = "1m",
+    ) -> Dict[str, Any]:
+        """Get OHLC bars for a symbol from processed_prices, aggregated in the database
+
+        Bars cover [start, end), default the last day, and are returned as
+        parallel columns (one entry per non-empty bucket, oldest first).
+        """
+        if bucket not in HISTORY_BUCKETS:
+            raise ValueError(f"Unknown bucket: {bucket} (expected one of {', '.join(HISTORY_BUCKETS)})")
+        seconds = HISTORY_BUCKETS[bucket]
+
+        # Timestamps are stored as naive UTC
+        end = self._naive_utc(end) if end else datetime.utcnow()
+        start = self._naive_utc(start) if start else end - timedelta(days=1)
+        if start >= end:
+            raise ValueError("start must be before end")
+        if (end - start).total_seconds() / seconds > settings.history_max_buckets:
+            raise ValueError(f"Range covers more than {settings.history_max_buckets} {bucket} buckets")
+
+        symbol = symbol.upper()
+        try:
+            bucket_start = time_bucket(db, ProcessedPrice.timestamp, seconds).label("bucket")
+            in_bucket = {"partition_by": bucket_start, "order_by": ProcessedPrice.timestamp, "rows": (None, None)}
+            # The (symbol, timestamp) index narrows the scan to the range before anything is aggregated
+            prices = (
+                select(
+                    bucket_start,
+                    ProcessedPrice.price,
+                    func.first_value(ProcessedPrice.price).over(**in_bucket).label("open"),
+                    func.last_value(ProcessedPrice.price).over(**in_bucket).label("close"),
+                )
+                .where(ProcessedPrice.symbol == symbol, ProcessedPrice.timestamp >= start, ProcessedPrice.timestamp < end)
+                .subquery()
+            )
+            result = await db.execute(
+                select(
+                    prices.c.bucket,
+                    func.min(prices.c.open),
+                    func.max(prices.c.price),
+                    func.min(prices.c.price),
+                    func.min(prices.c.close),
+                    func.count(),
+                )
+                .group_by(prices.c.bucket)
+                .order_by(prices.c.bucket)
+            )
+            rows = result.all()
+
+            return {
+                "symbol": symbol,
+                "bucket": bucket,
+                "timestamps": [row[0].isoformat() + "Z" for row in rows],
+                "open": [row[1] for row in rows],
+                "high": [row[2] for row in rows],
+                "low": [row[3] for row in rows],
+                "close": [row[4] for row in rows],
+                "count": [row[5] for row in rows],
+            }
+
+        except Exception as e:
+            logger.error(f"Error getting price history for {symbol}: {e}")
+            raise
+
+    @staticmethod
+    def _naive_utc(timestamp: datetime) -> datetime:
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        return timestamp
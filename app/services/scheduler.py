@@ -0,0 +1,292 @@
+import asyncio
+import heapq
+import json
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import get_async_sessionmaker
+from app.models.price import PollingJob, SchedulerInstance
+from app.services.price_service import PriceService
+
+logger = logging.getLogger(__name__)
+
+# Job statuses that are scheduled; new jobs are "accepted" until their first run
+ACTIVE_STATUSES = ("accepted", "active")
+
+
+@dataclass
+class ScheduledJob:
+    job_id: str
+    symbols: List[str]
+    interval: int
+    provider: str
+    next_run: float  # epoch seconds
+
+
+class PollingScheduler:
+    """Run active polling jobs from a heap keyed by next run time
+
+    Jobs that come due in the same tick are merged, so each (provider, symbol)
+    is fetched at most once per tick no matter how many jobs include it.
+
+    With several scheduler instances, each job is leased to one instance at a
+    time. Instances heartbeat into scheduler_instances, claim a fair share of
+    the jobs with SELECT ... FOR UPDATE SKIP LOCKED and renew their leases on
+    every refresh. A dead instance stops counting toward the fair share when
+    its leases expire, since heartbeat and leases are renewed together, so
+    its jobs move within lease_ttl + refresh_interval of its last renewal.
+    """
+
+    def __init__(
+        self,
+        price_service: PriceService,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        refresh_interval: Optional[float] = None,
+        instance_id: Optional[str] = None,
+        lease_ttl: Optional[float] = None,
+    ):
+        self.price_service = price_service
+        self.session_factory = session_factory or get_async_sessionmaker()
+        self.refresh_interval = refresh_interval or settings.scheduler_refresh_interval
+        self.instance_id = (
+            instance_id or settings.scheduler_instance_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        )
+        self.lease_ttl = timedelta(seconds=lease_ttl or settings.scheduler_lease_ttl)
+        if self.refresh_interval >= self.lease_ttl.total_seconds():
+            raise ValueError("Scheduler refresh interval must be shorter than the lease TTL")
+
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self.heap: List[Tuple[float, str]] = []
+        self.running = False
+        self._wakeup = asyncio.Event()
+
+    def _schedule(self, job: ScheduledJob) -> None:
+        # Superseded heap entries are skipped when popped (lazy deletion)
+        heapq.heappush(self.heap, (job.next_run, job.job_id))
+
+    async def _claim_jobs(self, db: AsyncSession) -> None:
+        """Renew our leases and claim or release jobs to hold a fair share"""
+        now = datetime.utcnow()
+        expires = now + self.lease_ttl
+        active = PollingJob.status.in_(ACTIVE_STATUSES)
+        live = PollingJob.lease_expires_at > now
+
+        await db.execute(
+            update(PollingJob).where(active, PollingJob.lease_owner == self.instance_id, live).values(lease_expires_at=expires)
+        )
+
+        # Heartbeat so other instances count us when computing their share
+        heartbeat = await db.execute(
+            update(SchedulerInstance).where(SchedulerInstance.instance_id == self.instance_id).values(heartbeat_at=now)
+        )
+        if heartbeat.rowcount == 0:
+            db.add(SchedulerInstance(instance_id=self.instance_id, heartbeat_at=now))
+            await db.flush()
+        await db.execute(delete(SchedulerInstance).where(SchedulerInstance.heartbeat_at < now - self.lease_ttl * 10))
+
+        total = await db.scalar(select(func.count()).select_from(PollingJob).where(active)) or 0
+        instances = (
+            await db.scalar(
+                select(func.count())
+                .select_from(SchedulerInstance)
+                .where(SchedulerInstance.heartbeat_at > now - self.lease_ttl)
+            )
+            or 0
+        )
+        owned = (
+            await db.scalar(
+                select(func.count()).select_from(PollingJob).where(active, live, PollingJob.lease_owner == self.instance_id)
+            )
+            or 0
+        )
+        fair_share = math.ceil(total / max(instances, 1)) if total else 0
+
+        if owned < fair_share:
+            claimable = (
+                select(PollingJob.id)
+                .where(active, or_(PollingJob.lease_owner.is_(None), PollingJob.lease_expires_at.is_(None), ~live))
+                .order_by(PollingJob.created_at)
+                .limit(fair_share - owned)
+                .with_for_update(skip_locked=True)
+            )
+            ids = (await db.execute(claimable)).scalars().all()
+            if ids:
+                await db.execute(
+                    update(PollingJob)
+                    .where(PollingJob.id.in_(ids))
+                    .values(lease_owner=self.instance_id, lease_expires_at=expires)
+                )
+                logger.info(f"Scheduler {self.instance_id} claimed {len(ids)} polling jobs")
+
+        elif owned > fair_share:
+            # Hand jobs to instances that joined; release those due last
+            excess = (
+                select(PollingJob.id)
+                .where(active, live, PollingJob.lease_owner == self.instance_id)
+                .order_by(PollingJob.last_run.desc())
+                .limit(owned - fair_share)
+                .with_for_update(skip_locked=True)
+            )
+            ids = (await db.execute(excess)).scalars().all()
+            if ids:
+                await db.execute(
+                    update(PollingJob).where(PollingJob.id.in_(ids)).values(lease_owner=None, lease_expires_at=None)
+                )
+                logger.info(f"Scheduler {self.instance_id} released {len(ids)} polling jobs")
+
+        await db.commit()
+
+    async def load_jobs(self) -> None:
+        """Refresh leases and sync the in-memory schedule with the jobs we own"""
+        async with self.session_factory() as db:
+            await self._claim_jobs(db)
+            result = await db.execute(
+                select(
+                    PollingJob.job_id, PollingJob.symbols, PollingJob.interval, PollingJob.provider, PollingJob.last_run
+                ).where(
+                    PollingJob.status.in_(ACTIVE_STATUSES),
+                    PollingJob.lease_owner == self.instance_id,
+                    PollingJob.lease_expires_at > datetime.utcnow(),
+                )
+            )
+            rows = result.all()
+
+        now = time.time()
+        owned: Set[str] = set()
+        for job_id, symbols_json, interval, provider, last_run in rows:
+            owned.add(job_id)
+            symbols = [symbol.upper() for symbol in json.loads(symbols_json)]
+            job = self.jobs.get(job_id)
+
+            if job is None:
+                # Resume from last_run so a job moving between instances is not run twice
+                next_run = now
+                if last_run:
+                    next_run = max(now, last_run.replace(tzinfo=timezone.utc).timestamp() + interval)
+                job = ScheduledJob(job_id, symbols, interval, provider, next_run)
+                self.jobs[job_id] = job
+                self._schedule(job)
+            else:
+                job.symbols, job.interval, job.provider = symbols, interval, provider
+
+        for job_id in set(self.jobs) - owned:
+            del self.jobs[job_id]
+
+    def _pop_due(self, now: float) -> List[ScheduledJob]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            next_run, job_id = heapq.heappop(self.heap)
+            job = self.jobs.get(job_id)
+            if job is not None and job.next_run == next_run:
+                due.append(job)
+        return due
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        """Run all jobs that are due and reschedule them; returns the number of fetches"""
+        now = now or time.time()
+        due = self._pop_due(now)
+        if not due:
+            return 0
+
+        async with self.session_factory() as db:
+            # Record the run first, and only for jobs whose lease is still ours
+            run_at = datetime.utcfromtimestamp(now)
+            result = await db.execute(
+                update(PollingJob)
+                .where(
+                    PollingJob.job_id.in_([job.job_id for job in due]),
+                    PollingJob.lease_owner == self.instance_id,
+                    PollingJob.lease_expires_at > run_at,
+                )
+                .values(last_run=run_at, status="active")
+                .returning(PollingJob.job_id)
+            )
+            leased = set(result.scalars().all())
+            await db.commit()
+
+            for job in due:
+                if job.job_id not in leased:
+                    logger.warning(f"Lost lease on polling job {job.job_id}, skipping it")
+                    del self.jobs[job.job_id]
+            due = [job for job in due if job.job_id in leased]
+
+            symbols_by_provider: Dict[str, Set[str]] = defaultdict(set)
+            for job in due:
+                symbols_by_provider[job.provider].update(job.symbols)
+
+            for provider, symbols in symbols_by_provider.items():
+                try:
+                    result = await self.price_service.get_latest_prices(db, sorted(symbols), provider, max_age=0)
+                    for error in result["errors"]:
+                        logger.warning(f"Polling {error['symbol']} from {provider} failed: {error['detail']}")
+                except Exception as e:
+                    logger.error(f"Polling {len(symbols)} symbols from {provider} failed: {e}")
+                    await db.rollback()
+
+        for job in due:
+            # Keep a fixed cadence, but never schedule into the past after a stall
+            job.next_run = max(job.next_run + job.interval, now + 1)
+            self._schedule(job)
+
+        fetches = sum(len(symbols) for symbols in symbols_by_provider.values())
+        if due:
+            logger.info(f"Ran {len(due)} polling jobs with {fetches} symbol fetches")
+        return fetches
+
+    async def release_leases(self) -> None:
+        """Give up all our leases so other instances take over immediately"""
+        async with self.session_factory() as db:
+            await db.execute(
+                update(PollingJob)
+                .where(PollingJob.lease_owner == self.instance_id)
+                .values(lease_owner=None, lease_expires_at=None)
+            )
+            await db.execute(delete(SchedulerInstance).where(SchedulerInstance.instance_id == self.instance_id))
+            await db.commit()
+        self.jobs.clear()
+        self.heap.clear()
+
+    async def run(self) -> None:
+        """Run the scheduler until stop() is called"""
+        self.running = True
+        next_refresh = 0.0
+        logger.info(f"Polling scheduler {self.instance_id} started")
+
+        while self.running:
+            now = time.time()
+            try:
+                if now >= next_refresh:
+                    await self.load_jobs()
+                    next_refresh = now + self.refresh_interval
+                await self.run_due(now)
+            except Exception as e:
+                logger.error(f"Polling scheduler error: {e}")
+
+            next_wake = min(self.heap[0][0] if self.heap else next_refresh, next_refresh)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, next_wake - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+        try:
+            await self.release_leases()
+        except Exception as e:
+            logger.error(f"Failed to release polling job leases: {e}")
+        logger.info(f"Polling scheduler {self.instance_id} stopped")
+
+    def stop(self) -> None:
+        self.running = False
+        self._wakeup.set()
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+
+
+class SingleFlightOverloaded(Exception):
+    """Raised when too many callers are already waiting on the same key"""
+
+    pass
+
+
+class _Call:
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight call
+
+    The first caller for a key (the leader) starts the call; callers arriving
+    while it runs wait for the same result instead of starting their own.
+    The call runs as its own task, so a cancelled leader does not fail the
+    callers waiting on it.
+    """
+
+    def __init__(self, max_waiters: int = 1000, timeout: Optional[float] = None):
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run fn once for all concurrent callers of key
+
+        Returns the result and whether it was shared from another caller's call.
+        Waiting callers are limited to max_waiters per key and give up after
+        timeout seconds.
+        """
+        call = self._calls.get(key)
+        if call is not None:
+            return await self._wait(key, call), True
+
+        call = self._start(key, asyncio.ensure_future(fn()))
+        return await asyncio.shield(call.task), False
+
+    async def do_many(
+        self, keys: List[K], fn: Callable[[List[K]], Awaitable[Dict[K, Any]]]
+    ) -> List[Union[Tuple[Any, bool], BaseException]]:
+        """Run one bulk call for all keys that are not already in flight
+
+        fn gets the keys this caller leads and returns a result or an exception
+        per key; keys missing from its result fail with KeyError. Keys already in flight
+        join the existing call. Returns (result, shared) or the exception for
+        each key, in order.
+        """
+        leading = [key for key in dict.fromkeys(keys) if key not in self._calls]
+        if leading:
+            bulk = asyncio.ensure_future(fn(leading))
+            for key in leading:
+                self._start(key, asyncio.ensure_future(self._pick(bulk, key)))
+
+        calls = {key: self._calls[key] for key in keys}
+        leaders = set(leading)
+
+        async def one(key: K) -> Tuple[Any, bool]:
+            if key in leaders:
+                return await asyncio.shield(calls[key].task), False
+            return await self._wait(key, calls[key]), True
+
+        return await asyncio.gather(*(one(key) for key in keys), return_exceptions=True)
+
+    @staticmethod
+    async def _pick(bulk: asyncio.Future, key: Hashable) -> Any:
+        results = await asyncio.shield(bulk)
+        if key not in results:
+            raise KeyError(key)
+        if isinstance(results[key], BaseException):
+            raise results[key]
+        return results[key]
+
+    def _start(self, key: Hashable, task: asyncio.Future) -> _Call:
+        call = _Call(task)
+        self._calls[key] = call
+        call.task.add_done_callback(lambda task: self._finish(key, call))
+        return call
+
+    async def _wait(self, key: Hashable, call: _Call) -> Any:
+        if call.waiters >= self.max_waiters:
+            raise SingleFlightOverloaded(f"Too many callers waiting for {key}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.task), self.timeout)
+        finally:
+            call.waiters -= 1
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every caller has gone away
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
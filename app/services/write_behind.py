@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import get_async_sessionmaker
+from app.models.price import RawMarketData
+
+logger = logging.getLogger(__name__)
+
+
+class RawDataWriter:
+    """Write-behind buffer for raw_market_data rows
+
+    Rows (with client-side IDs) are queued and inserted in bulk by a
+    background task, every flush_interval seconds or once batch_size rows are
+    waiting. The queue holds at most max_pending rows; when it is full, add()
+    waits for the writer to catch up. A failed batch is retried a few times
+    and then dropped with an error, so a database outage cannot grow memory.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        max_pending: Optional[int] = None,
+        retries: int = 3,
+    ):
+        self.session_factory = session_factory or get_async_sessionmaker()
+        self.batch_size = batch_size or settings.raw_write_batch_size
+        self.flush_interval = flush_interval or settings.raw_write_flush_interval
+        self.retries = retries
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending or settings.raw_write_max_pending)
+        self.written = 0
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[Dict[str, Any]] = []  # rows taken off the queue, not yet written
+        self._writing: Optional[asyncio.Future] = None
+        self._full = asyncio.Event()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, rows: List[Dict[str, Any]]) -> None:
+        """Queue rows for insertion, waiting for room if the buffer is full"""
+        for row in rows:
+            await self.queue.put(row)
+        if self.queue.qsize() >= self.batch_size:
+            self._full.set()
+
+    async def _next_batch(self) -> None:
+        """Wait for the first row, then until a batch is queued or the interval ends"""
+        self._batch.append(await self.queue.get())
+        if self.queue.qsize() < self.batch_size - 1:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+        self._full.clear()
+        while len(self._batch) < self.batch_size and not self.queue.empty():
+            self._batch.append(self.queue.get_nowait())
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(1, self.retries + 1):
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(insert(RawMarketData), batch)
+                    await db.commit()
+                self.written += len(batch)
+                return
+            except Exception as e:
+                logger.warning(f"Writing {len(batch)} raw rows failed (attempt {attempt}/{self.retries}): {e}")
+                if attempt < self.retries:
+                    await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+        self.dropped += len(batch)
+        logger.error(f"Dropped {len(batch)} raw rows after {self.retries} failed attempts")
+
+    async def _run(self) -> None:
+        while True:
+            await self._next_batch()
+            batch, self._batch = self._batch, []
+            # Shielded so stopping the writer never abandons an insert half way
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+
+    async def flush(self) -> None:
+        """Write every buffered row now"""
+        if self._batch:
+            batch, self._batch = self._batch, []
+            await self._write(batch)
+        while not self.queue.empty():
+            batch = []
+            while not self.queue.empty() and len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+            await self._write(batch)
+
+    async def close(self) -> None:
+        """Stop the background task and write the rows still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None:
+            await self._writing
+        await self.flush()
+        logger.info(f"Raw data writer closed: {self.written} rows written, {self.dropped} dropped")
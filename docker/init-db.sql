@@ -25,11 +25,30 @@ CREATE TABLE IF NOT EXISTS processed_prices (
 CREATE TABLE IF NOT EXISTS moving_averages (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     symbol VARCHAR(10) NOT NULL,
+    kind VARCHAR(10) NOT NULL DEFAULT 'sma',
     window_size INTEGER NOT NULL,
     value DECIMAL(10,2) NOT NULL,
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Latest values per key, upserted by the consumer for primary-key reads
+CREATE TABLE IF NOT EXISTS latest_prices (
+    symbol VARCHAR(10) PRIMARY KEY,
+    price DECIMAL(10,2) NOT NULL,
+    timestamp TIMESTAMP NOT NULL,
+    provider VARCHAR(50) NOT NULL,
+    raw_response_id UUID
+);
+
+CREATE TABLE IF NOT EXISTS latest_moving_averages (
+    symbol VARCHAR(10) NOT NULL,
+    kind VARCHAR(10) NOT NULL,
+    window_size INTEGER NOT NULL,
+    value DECIMAL(10,2) NOT NULL,
+    timestamp TIMESTAMP NOT NULL,
+    PRIMARY KEY (symbol, kind, window_size)
+);
+
 CREATE TABLE IF NOT EXISTS polling_jobs (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     job_id VARCHAR(100) UNIQUE NOT NULL,
@@ -38,11 +57,27 @@ CREATE TABLE IF NOT EXISTS polling_jobs (
     provider VARCHAR(50) NOT NULL,
     status VARCHAR(20) DEFAULT 'active',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    last_run TIMESTAMP
+    last_run TIMESTAMP,
+    lease_owner VARCHAR(100),
+    lease_expires_at TIMESTAMP
 );
 
+CREATE TABLE IF NOT EXISTS scheduler_instances (
+    instance_id VARCHAR(100) PRIMARY KEY,
+    heartbeat_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Upgrade databases created by earlier versions (CREATE TABLE IF NOT EXISTS skips new columns)
+ALTER TABLE moving_averages ADD COLUMN IF NOT EXISTS kind VARCHAR(10) NOT NULL DEFAULT 'sma';
+ALTER TABLE polling_jobs ADD COLUMN IF NOT EXISTS lease_owner VARCHAR(100);
+ALTER TABLE polling_jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+
 -- Create indexes
 CREATE INDEX IF NOT EXISTS idx_raw_market_data_symbol_timestamp ON raw_market_data(symbol, timestamp);
 CREATE INDEX IF NOT EXISTS idx_processed_prices_symbol_timestamp ON processed_prices(symbol, timestamp);
+-- Replaces idx_moving_averages_symbol_window, which older databases have without kind
+DROP INDEX IF EXISTS idx_moving_averages_symbol_window;
+CREATE INDEX IF NOT EXISTS idx_moving_averages_symbol_kind_window ON moving_averages(symbol, kind, window_size, timestamp);
+CREATE INDEX IF NOT EXISTS idx_polling_jobs_lease ON polling_jobs(lease_owner, lease_expires_at);
 
 \echo 'Market Data Service tables created successfully!'
\ No newline at end of file
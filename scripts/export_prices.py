@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Export processed_prices or raw_market_data as NDJSON, CSV or Arrow IPC
+
+Rows are streamed from a server-side cursor, so exports of any size run in
+constant memory. Output goes to stdout unless --output is given.
+
+    python scripts/export_prices.py --table processed_prices --symbol AAPL \
+        --start 2024-01-01 --end 2024-04-01 --format csv --output aapl.csv
+"""
+import argparse
+import logging
+import sys
+import os
+from datetime import datetime
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.database import SessionLocal
+from app.services.export import EXPORT_TABLES, available_formats, export_query, get_encoder, iter_export
+
+# Configure logging (stderr, so stdout can carry the export)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export price tables")
+    parser.add_argument("--table", choices=list(EXPORT_TABLES), default="processed_prices")
+    parser.add_argument("--format", choices=available_formats(), default="ndjson")
+    parser.add_argument("--symbol", help="only export this symbol")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="start of the range (inclusive, UTC)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="end of the range (exclusive, UTC)")
+    parser.add_argument("--batch-size", type=int, help="rows per cursor fetch (default EXPORT_BATCH_SIZE)")
+    parser.add_argument("--output", help="file to write (default stdout)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    query = export_query(args.table, args.symbol, args.start, args.end)
+    encoder = get_encoder(args.format, query)
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        with SessionLocal() as db:
+            for chunk in iter_export(db, query, encoder, args.batch_size):
+                output.write(chunk)
+        logger.info(f"Exported {args.table} as {args.format}")
+    except Exception as e:
+        logger.error(f"Export failed: {e}")
+        sys.exit(1)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 #!/usr/bin/env python3
 """
 Standalone script to run the Kafka consumer for moving averages
+
+With --processes N (or CONSUMER_PROCESSES) greater than 1, N worker processes
+are started in the same consumer group and supervised by this process.
 """
+import argparse
 import asyncio
 import logging
 import sys
@@ -10,7 +14,8 @@ import os
 # Add the app directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from app.services.kafka.consumer import MovingAverageConsumer
+from app.core.config import settings
+from app.services.kafka.supervisor import ConsumerSupervisor, serve_consumer
 
 # Configure logging
 logging.basicConfig(
@@ -23,18 +28,30 @@ logger = logging.getLogger(__name__)
 
 async def main():
     """Main function to run the consumer"""
-    consumer = MovingAverageConsumer()
-    
     try:
         logger.info("Starting Moving Average Consumer...")
-        await consumer.start_consuming()
-    except KeyboardInterrupt:
-        logger.info("Shutting down consumer...")
-        consumer.stop()
+        await serve_consumer()
+        logger.info("Consumer shut down")
     except Exception as e:
         logger.error(f"Consumer error: {e}")
         sys.exit(1)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the moving average consumer")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.consumer_processes,
+        help="Number of consumer worker processes (default: CONSUMER_PROCESSES)",
+    )
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    args = parse_args()
+
+    if args.processes > 1:
+        ConsumerSupervisor(args.processes).run()
+    else:
+        asyncio.run(main())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Standalone script to run the polling job scheduler
+"""
+import asyncio
+import logging
+import signal
+import sys
+import os
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.database import dispose_async_engine
+from app.services.market_data import close_providers
+from app.services.price_service import PriceService
+from app.services.scheduler import PollingScheduler
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """Main function to run the scheduler"""
+    price_service = PriceService()
+    scheduler = PollingScheduler(price_service)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, scheduler.stop)
+
+    try:
+        logger.info("Starting Polling Scheduler...")
+        await scheduler.run()
+    except Exception as e:
+        logger.error(f"Scheduler error: {e}")
+        sys.exit(1)
+    finally:
+        await price_service.close()
+        await close_providers()
+        await dispose_async_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,15 +1,19 @@
 import pytest
+import pytest_asyncio
 import asyncio
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 from app.main import app
-from app.core.database import Base, get_db
+from app.core.database import Base, get_async_db, get_async_sessionmaker, get_db
 import tempfile
 import os
 
 # Create test database
 TEST_DATABASE_URL = "sqlite:///./test.db"
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
 
 @pytest.fixture(scope="session")
@@ -35,8 +39,26 @@ def test_db(test_engine):
         session.close()
 
 
+@pytest.fixture(scope="session")
+def async_test_sessionmaker(test_engine):
+    """Create async session factory on the test database
+
+    NullPool keeps connections from being shared between event loops
+    (the TestClient runs the app on its own loop).
+    """
+    engine = create_async_engine(TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+    return async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def async_test_db(async_test_sessionmaker):
+    """Create async test database session"""
+    async with async_test_sessionmaker() as session:
+        yield session
+
+
 @pytest.fixture(scope="function")
-def client(test_db):
+def client(test_db, async_test_sessionmaker):
     """Create test client"""
 
     def override_get_db():
@@ -45,7 +67,13 @@ def client(test_db):
         finally:
             pass
 
+    async def override_get_async_db():
+        async with async_test_sessionmaker() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_sessionmaker] = lambda: async_test_sessionmaker
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
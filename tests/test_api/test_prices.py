@@ -1,7 +1,15 @@
+import json
+from datetime import datetime
+
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
+from app.api.endpoints.prices import stream_prices_sse
+from app.models.price import ProcessedPrice
+from app.services.live import PriceHub
+
 
 def test_health_check(client: TestClient):
     """Test health check endpoint"""
@@ -63,3 +71,45 @@ def test_create_poll_job_invalid_interval(client: TestClient):
 
     response = client.post("/api/v1/prices/poll", json=request_data)
     assert response.status_code == 422  # Validation error
+
+
+def test_export_prices_streams_rows(client: TestClient, test_db):
+    """Test that the export endpoint streams processed prices as NDJSON and CSV"""
+    test_db.query(ProcessedPrice).delete()
+    test_db.add_all(
+        [
+            ProcessedPrice(symbol="AAPL", price=150.25, timestamp=datetime(2024, 3, 20, 10, 30), provider="finnhub"),
+            ProcessedPrice(symbol="AAPL", price=150.5, timestamp=datetime(2024, 3, 20, 10, 31), provider="finnhub"),
+            ProcessedPrice(symbol="MSFT", price=400.0, timestamp=datetime(2024, 3, 20, 10, 30), provider="finnhub"),
+        ]
+    )
+    test_db.commit()
+
+    response = client.get("/api/v1/prices/export?symbol=aapl")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["price"], row["timestamp"]) for row in rows] == [
+        (150.25, "2024-03-20T10:30:00Z"),
+        (150.5, "2024-03-20T10:31:00Z"),
+    ]
+
+    response = client.get("/api/v1/prices/export?format=csv&start=2024-03-20T10:31:00Z")
+    lines = response.text.splitlines()
+    assert lines[0].split(",") == ["id", "symbol", "price", "timestamp", "provider", "raw_response_id"]
+    assert len(lines) == 2 and ",AAPL,150.5," in lines[1]
+
+    assert client.get("/api/v1/prices/export?format=xml").status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_sse_subscribes_only_once_the_stream_starts():
+    """Test that an SSE response that is never streamed leaves no subscription behind"""
+    hub = PriceHub(consumer_factory=MagicMock())
+
+    response = await stream_prices_sse(request=MagicMock(), symbols="AAPL,MSFT", hub=hub)
+    assert response.media_type == "text/event-stream"
+    assert hub.subscribers("AAPL") == 0
+
+    with pytest.raises(HTTPException):
+        await stream_prices_sse(request=MagicMock(), symbols=" , ", hub=hub)
@@ -0,0 +1,90 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.market_data.base import MarketDataProvider
+from app.services.market_data.circuit_breaker import CircuitBreaker
+from app.services.market_data.rate_limit import RateLimitExceeded
+
+
+def test_breaker_opens_on_failure_rate_and_recovers():
+    """Test closed -> open -> half-open -> closed transitions"""
+    breaker = CircuitBreaker("finnhub", failure_rate=0.5, window=4, min_calls=4, open_seconds=30)
+
+    for success in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(success, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    with patch("app.services.market_data.circuit_breaker.time.monotonic", return_value=breaker.opened_at + 31):
+        assert breaker.allow()  # trial call
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not breaker.allow()  # only one trial at a time
+        breaker.record(True, 0.1)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_opens_on_slow_calls():
+    """Test that slow successful calls also open the circuit"""
+    breaker = CircuitBreaker("yahoo_finance", slow_call_seconds=1.0, slow_call_rate=0.5, window=2, min_calls=2)
+
+    breaker.record(True, 1.5)
+    breaker.record(True, 2.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+class GuardedProvider(MarketDataProvider):
+    async def get_latest_price(self, symbol: str):
+        return {"symbol": symbol, "price": 150.25}
+
+    def get_provider_name(self) -> str:
+        return "guarded"
+
+    def get_rate_limit(self) -> int:
+        return 60
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [RateLimitExceeded("no tokens"), asyncio.CancelledError()])
+async def test_guarded_returns_trial_slot_when_not_admitted(error):
+    """Test that a half-open trial rejected by the rate limiter does not leave the circuit stuck"""
+    provider = GuardedProvider()
+    provider.circuit_breaker = CircuitBreaker("guarded", open_seconds=30)
+    provider.circuit_breaker._transition(CircuitBreaker.OPEN)
+    provider.rate_limiter = MagicMock(acquire=AsyncMock(side_effect=error))
+
+    with patch(
+        "app.services.market_data.circuit_breaker.time.monotonic", return_value=provider.circuit_breaker.opened_at + 31
+    ):
+        with pytest.raises(type(error)):
+            await provider._guarded(lambda: provider.get_latest_price("AAPL"))
+        assert provider.circuit_breaker.trials == 0
+
+        provider.rate_limiter.acquire = AsyncMock()
+        assert (await provider._guarded(lambda: provider.get_latest_price("AAPL")))["price"] == 150.25
+
+    assert provider.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_cancelled_symbol_is_an_error_not_a_price():
+    """Test that a per-symbol call cancelled inside a batch is reported as an error, without a fallback"""
+    provider = GuardedProvider()
+    price = provider.get_latest_price
+
+    async def cancelled_for_msft(symbol: str):
+        if symbol == "MSFT":
+            raise asyncio.CancelledError()
+        return await price(symbol)
+
+    provider.get_latest_price = cancelled_for_msft
+    assert list(await provider.get_latest_prices(["AAPL", "MSFT"])) == ["AAPL"]
+
+    with patch.object(provider, "get_fallback_price", return_value={"symbol": "MSFT", "price": 1.0}) as fallback:
+        results = await provider.fetch_latest_prices(["AAPL", "MSFT"])
+    assert results["AAPL"]["price"] == 150.25
+    assert isinstance(results["MSFT"], asyncio.CancelledError)
+    fallback.assert_not_called()
@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.services.market_data.base import MarketDataProvider
+from app.services.market_data.composite import CompositeProvider
+
+
+class FakeProvider(MarketDataProvider):
+    def __init__(self, name: str, delay: float, price: float = 150.25, fail: bool = False):
+        super().__init__()
+        self.name = name
+        self.delay = delay
+        self.price = price
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def get_latest_price(self, symbol: str):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise ConnectionError("upstream down")
+        return {"symbol": symbol, "price": self.price, "timestamp": datetime.utcnow(), "provider": self.name}
+
+    def get_provider_name(self) -> str:
+        return self.name
+
+    def get_rate_limit(self) -> int:
+        return 60
+
+
+@pytest.mark.asyncio
+async def test_slow_provider_is_hedged():
+    """Test that a hedged request wins when the first provider is slow"""
+    slow = FakeProvider("slow", delay=1.0)
+    fast = FakeProvider("fast", delay=0.01)
+    composite = CompositeProvider([slow, fast])
+    for _ in range(10):
+        composite.stats["slow"].record(True, 0.05)  # ranked first with a p95 of 50ms
+        composite.stats["fast"].record(True, 0.1)
+
+    price_data = await composite.fetch_latest_price("AAPL", budget=2.0)
+
+    assert price_data["provider"] == "fast"
+    await asyncio.sleep(0.01)  # let the cancellation of the loser run
+    assert slow.calls == 1 and slow.cancelled == 1
+    # The cancelled hedge loser is not counted as a failure
+    assert composite.stats["slow"].error_rate() == 0.0
+
+
+@pytest.mark.asyncio
+async def test_failures_move_on_and_lower_the_rank():
+    """Test that a failing provider is skipped at once and ranked last afterwards"""
+    broken = FakeProvider("broken", delay=0.0, fail=True)
+    healthy = FakeProvider("healthy", delay=0.01)
+    composite = CompositeProvider([broken, healthy])
+
+    price_data = await composite.fetch_latest_price("AAPL", budget=2.0, fallback=False)
+    assert price_data["provider"] == "healthy"
+    assert [provider.get_provider_name() for provider in composite.ranked()] == ["healthy", "broken"]
+
+    invalid = FakeProvider("invalid", delay=0.0, price=0.0)
+    composite = CompositeProvider([invalid])
+    with pytest.raises(ValueError):
+        await composite.fetch_latest_price("AAPL", budget=2.0, fallback=False)
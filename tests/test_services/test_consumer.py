@@ -0,0 +1,184 @@
+import asyncio
+import json
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import delete, select
+from sqlalchemy.orm import sessionmaker
+
+from app.models.price import LatestMovingAverage, LatestPrice, MovingAverage, ProcessedPrice
+from app.services.kafka.consumer import MovingAverageConsumer
+
+
+def make_message(symbol: str, price: float, offset: int, partition: int = 0):
+    """Build a fake Kafka message carrying a JSON price event"""
+    msg = MagicMock()
+    msg.value.return_value = json.dumps(
+        {"symbol": symbol, "price": price, "timestamp": "2024-03-20T10:30:00Z", "source": "finnhub"}
+    ).encode("utf-8")
+    msg.topic.return_value = "price-events"
+    msg.partition.return_value = partition
+    msg.offset.return_value = offset
+    msg.error.return_value = None
+    msg.headers.return_value = None
+    return msg
+
+
+@pytest.fixture
+def consumer():
+    with patch("app.services.kafka.consumer.Consumer"):
+        yield MovingAverageConsumer()
+
+
+def test_process_batch_commits_offsets_after_store(consumer):
+    """Test that offsets are committed only after the batch is stored"""
+    calls = []
+    consumer.store_price_events = MagicMock(side_effect=lambda events: calls.append("store"))
+    consumer.consumer.commit.side_effect = lambda **kwargs: calls.append("commit")
+
+    bad = make_message("AAPL", 1.0, 11)
+    bad.value.return_value = b"not json"
+    consumer.process_batch([make_message("AAPL", 150.0, 10), bad, make_message("MSFT", 400.0, 3, partition=1)])
+
+    assert calls == ["store", "commit"]
+    events = consumer.store_price_events.call_args[0][0]
+    assert [e["symbol"] for e in events] == ["AAPL", "MSFT"]
+
+    offsets = {(tp.partition, tp.offset) for tp in consumer.consumer.commit.call_args.kwargs["offsets"]}
+    assert offsets == {(0, 12), (1, 4)}
+
+
+def test_process_batch_does_not_commit_on_failure(consumer):
+    """Test that a failed transaction leaves offsets uncommitted"""
+    consumer.store_price_events = MagicMock(side_effect=RuntimeError("db down"))
+
+    with pytest.raises(RuntimeError):
+        consumer.process_batch([make_message("AAPL", 150.0, 10)])
+
+    consumer.consumer.commit.assert_not_called()
+
+
+def test_latest_tables_only_move_forward(consumer, test_db):
+    """Test that the latest-value upserts keep the newest row per key"""
+    test_db.execute(delete(LatestPrice))
+    test_db.execute(delete(LatestMovingAverage))
+
+    def rows(price: float, timestamp: datetime):
+        processed = [
+            {"symbol": "AAPL", "price": price, "timestamp": timestamp, "provider": "finnhub", "raw_response_id": None}
+        ]
+        averages = [{"symbol": "AAPL", "kind": "sma", "window_size": 5, "value": price, "timestamp": timestamp}]
+        return processed, averages
+
+    consumer._upsert_latest(test_db, *rows(150.0, datetime(2024, 3, 20, 10, 30)))
+    consumer._upsert_latest(test_db, *rows(151.0, datetime(2024, 3, 20, 10, 31)))
+    # A redelivered older event does not replace the newer value
+    consumer._upsert_latest(test_db, *rows(149.0, datetime(2024, 3, 20, 10, 29)))
+    test_db.commit()
+
+    assert test_db.get(LatestPrice, "AAPL").price == 151.0
+    assert test_db.get(LatestMovingAverage, ("AAPL", "sma", 5)).value == 151.0
+
+
+def test_poison_event_is_isolated_and_dead_lettered(consumer):
+    """Test that an event that can never be stored is set aside so the rest of the batch commits"""
+    stored = []
+
+    def store(events):
+        if any(event["symbol"] == "TOOLONGSYMBOL" for event in events):
+            raise ValueError("value too long for type character varying(10)")
+        stored.extend(event["symbol"] for event in events)
+
+    consumer.store_price_events = MagicMock(side_effect=store)
+    consumer.dead_letter_topic = "price-events-dead-letter"
+    consumer.dead_letter_producer = MagicMock()
+    messages = [make_message(symbol, 1.0, offset) for offset, symbol in enumerate(["AAPL", "TOOLONGSYMBOL", "MSFT", "NVDA"])]
+
+    consumer.process_batch(messages, isolate_failures=True)
+
+    assert stored == ["AAPL", "MSFT", "NVDA"]
+    dead_letter = consumer.dead_letter_producer.produce.call_args.kwargs
+    assert dead_letter["topic"] == "price-events-dead-letter"
+    assert dead_letter["value"] == messages[1].value()
+    offsets = {(tp.partition, tp.offset) for tp in consumer.consumer.commit.call_args.kwargs["offsets"]}
+    assert offsets == {(0, 4)}
+
+
+@pytest.mark.asyncio
+async def test_worker_stops_retrying_a_failing_batch(consumer):
+    """Test that a batch failing every attempt is isolated after max_retries instead of retried forever"""
+    consumer.running = True
+    consumer.max_retries = 2
+    consumer.process_batch = MagicMock(side_effect=[ValueError("bad"), ValueError("bad"), None])
+    queue = asyncio.Queue()
+    await queue.put([make_message("AAPL", 1.0, 0)])
+
+    with patch("app.services.kafka.consumer.asyncio.sleep", new=AsyncMock()):
+        worker = asyncio.create_task(consumer._worker(queue))
+        await asyncio.wait_for(queue.join(), 1.0)
+        worker.cancel()
+
+    assert [call.args[1] for call in consumer.process_batch.call_args_list] == [False, False, True]
+
+
+def test_indicator_rows_carry_their_tick_timestamp(consumer, test_engine, test_db):
+    """Test that each moving average row is stamped with the time of the tick that produced it"""
+    test_db.execute(delete(ProcessedPrice).where(ProcessedPrice.symbol == "AMZN"))
+    test_db.execute(delete(MovingAverage).where(MovingAverage.symbol == "AMZN"))
+    test_db.commit()
+    events = [
+        {"symbol": "AMZN", "price": price, "timestamp": datetime(2024, 3, 20, 10, minute), "provider": "finnhub"}
+        for minute, price in [(30, 10.0), (31, 20.0)]
+    ]
+
+    with patch("app.services.kafka.consumer.SessionLocal", sessionmaker(bind=test_engine)):
+        consumer.store_price_events(events)
+
+    rows = test_db.execute(
+        select(MovingAverage.timestamp, MovingAverage.value)
+        .where(MovingAverage.symbol == "AMZN", MovingAverage.kind == "sma", MovingAverage.window_size == 5)
+        .order_by(MovingAverage.timestamp)
+    ).all()
+    assert [tuple(row) for row in rows] == [(datetime(2024, 3, 20, 10, 30), 10.0), (datetime(2024, 3, 20, 10, 31), 15.0)]
+    latest = test_db.get(LatestMovingAverage, ("AMZN", "sma", 5))
+    assert (latest.timestamp, latest.value) == (datetime(2024, 3, 20, 10, 31), 15.0)
+
+
+@pytest.mark.asyncio
+async def test_dropped_batch_abandons_its_partition(consumer):
+    """Test that after a batch is dropped on shutdown, later batches for its partition are not committed"""
+    consumer.running = False
+    consumer.store_price_events = MagicMock(side_effect=[RuntimeError("db down"), None])
+    queue = asyncio.Queue()
+    await queue.put([make_message("AAPL", 1.0, 10)])
+    await queue.put([make_message("AAPL", 2.0, 11), make_message("MSFT", 3.0, 5, partition=1)])
+
+    worker = asyncio.create_task(consumer._worker(queue))
+    await asyncio.wait_for(queue.join(), 1.0)
+    worker.cancel()
+
+    stored = consumer.store_price_events.call_args_list[1].args[0]
+    assert [event["symbol"] for event in stored] == ["MSFT"]
+    offsets = {(tp.partition, tp.offset) for tp in consumer.consumer.commit.call_args.kwargs["offsets"]}
+    assert offsets == {(1, 6)}
+
+
+@pytest.mark.asyncio
+async def test_revoke_waits_for_workers_and_drops_failing_batches(consumer):
+    """Test that a rebalance only proceeds once the workers are idle, without retrying forever"""
+    consumer.running = True
+    consumer.drain_timeout = 0.05
+    consumer.loop = asyncio.get_running_loop()
+    consumer.queues = [asyncio.Queue()]
+    consumer.process_batch = MagicMock(side_effect=ValueError("bad"))
+    await consumer.queues[0].put([make_message("AAPL", 1.0, 10)])
+
+    with patch("app.services.kafka.consumer.asyncio.sleep", new=AsyncMock()):
+        worker = asyncio.create_task(consumer._worker(consumer.queues[0]))
+        await asyncio.wait_for(asyncio.to_thread(consumer._on_revoke, consumer.consumer, []), 2.0)
+        worker.cancel()
+
+    assert consumer.queues[0].empty() and not consumer.revoking
+    assert consumer.abandoned == {("price-events", 0)}
+    consumer.consumer.commit.assert_not_called()
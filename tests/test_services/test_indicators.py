@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from app.services.kafka.indicators import EMA, SMA, IndicatorEngine, ema, sma
+
+
+def test_sma_partial_and_full_windows():
+    """Test averages before and after the window fills, with and without history"""
+    assert sma(np.array([1.0, 2.0, 3.0, 4.0]), 3).tolist() == [1.0, 1.5, 2.0, 3.0]
+    assert sma(np.array([4.0, 5.0]), 3, history=np.array([1.0, 2.0, 3.0])).tolist() == [3.0, 4.0]
+
+
+def test_engine_batches_match_tick_by_tick():
+    """Test that one batch update gives the same values as updating per tick"""
+    prices = [10.0, 20.0, 30.0, 40.0, 50.0, 60.0]
+    batched = IndicatorEngine([3, 5], [4])
+    batched.seed("AAPL", [1.0, 2.0])
+    values = batched.update("AAPL", prices)
+
+    ticked = IndicatorEngine([3, 5], [4])
+    ticked.seed("AAPL", [1.0, 2.0])
+    per_tick = [ticked.update("AAPL", [price]) for price in prices]
+
+    assert set(values) == {(SMA, 3), (SMA, 5), (EMA, 4)}
+    for indicator, series in values.items():
+        assert series == pytest.approx([tick[indicator][0] for tick in per_tick])
+
+    assert values[(SMA, 5)][-1] == 40.0
+    assert values[(EMA, 4)][-1] == pytest.approx(ema(np.array([1.0, 2.0] + prices), 4)[-1])
+
+    batched.reset(["AAPL"])
+    assert "AAPL" not in batched
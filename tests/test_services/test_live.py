@@ -0,0 +1,94 @@
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services.kafka.serialization import encode_price_event
+from app.services.live import PriceHub, Subscription
+
+
+class FakeMessage:
+    def __init__(self, symbol: str, price: float):
+        message = {"symbol": symbol, "price": price, "timestamp": "2024-03-20T10:30:00Z", "source": "finnhub"}
+        self._value, self._headers = encode_price_event(message)
+
+    def error(self):
+        return None
+
+    def value(self):
+        return self._value
+
+    def headers(self):
+        return self._headers
+
+
+class FakeConsumer:
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.closed = threading.Event()
+
+    def subscribe(self, topics):
+        pass
+
+    def consume(self, num_messages, timeout):
+        if self.batches:
+            return self.batches.pop(0)
+        self.closed.wait(timeout)
+        return []
+
+    def close(self):
+        self.closed.set()
+
+
+@pytest.mark.asyncio
+async def test_events_fan_out_to_symbol_subscribers():
+    """Test that one consumer feeds every subscriber of a symbol, and only those"""
+    consumer = FakeConsumer([[FakeMessage("AAPL", 150.25), FakeMessage("MSFT", 400.0), FakeMessage("TSLA", 1.0)]])
+    hub = PriceHub(consumer_factory=lambda: consumer)
+    first = hub.subscribe(["aapl", "msft"])
+    second = hub.subscribe("AAPL")
+
+    first_frames = [await asyncio.wait_for(first.get(), 1.0) for _ in range(2)]
+    assert ['"AAPL"' in first_frames[0], '"MSFT"' in first_frames[1]] == [True, True]
+    assert '"price": 150.25' in await asyncio.wait_for(second.get(), 1.0)
+    assert await second.get(timeout=0.05) is None
+
+    hub.unsubscribe(first)
+    assert (hub.subscribers("AAPL"), hub.subscribers("MSFT")) == (1, 0)
+    with pytest.raises(ValueError):
+        hub.update(second, add=[f"S{i}" for i in range(100)])
+
+    await hub.close()
+    assert consumer.closed.is_set()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_drops_oldest_frames():
+    """Test that a full queue keeps the newest frames"""
+    subscription = Subscription(max_queue=2)
+    for frame in ["1", "2", "3"]:
+        subscription.push(frame)
+
+    assert [await subscription.get(), await subscription.get()] == ["2", "3"]
+    assert subscription.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_consumer_survives_bad_messages_and_failures():
+    """Test that unexpected errors skip the message or restart the consumer instead of ending the feed"""
+    broken = FakeMessage("AAPL", 1.0)
+    broken.value = MagicMock(side_effect=AttributeError("boom"))
+    consumers = [RuntimeError("broker unreachable"), FakeConsumer([[broken, FakeMessage("AAPL", 150.25)]])]
+
+    def factory():
+        consumer = consumers.pop(0)
+        if isinstance(consumer, Exception):
+            raise consumer
+        return consumer
+
+    hub = PriceHub(consumer_factory=factory)
+    subscription = hub.subscribe(["AAPL"])
+
+    assert '"price": 150.25' in await asyncio.wait_for(subscription.get(), 3.0)
+    await hub.close()
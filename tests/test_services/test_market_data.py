@@ -0,0 +1,83 @@
+import time
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from app.services.market_data import YahooFinanceProvider, close_providers, get_provider
+
+
+@pytest.mark.asyncio
+async def test_get_provider_reuses_instances():
+    """Test that providers are cached per name and API key"""
+    first = get_provider("finnhub", "test-key-1234567890")
+    assert get_provider("finnhub", "test-key-1234567890") is first
+    assert get_provider("finnhub", "other-key-1234567890") is not first
+
+    client = first._get_client()
+    assert first._get_client() is client
+
+    await close_providers()
+    assert client.is_closed
+    assert get_provider("finnhub", "test-key-1234567890") is not first
+    await close_providers()
+
+
+@pytest.mark.asyncio
+async def test_yahoo_batch_uses_one_download_per_chunk():
+    """Test that Yahoo batch quotes come from bulk downloads of up to max_batch_symbols"""
+    provider = YahooFinanceProvider()
+    provider.max_batch_symbols = 2
+
+    def fake_download(symbols, **kwargs):
+        columns = pd.MultiIndex.from_product([symbols, ["Open", "Close"]])
+        data = pd.DataFrame([[1.0, 10.0] * len(symbols)], index=pd.to_datetime(["2024-03-20"]), columns=columns)
+        if "BAD" in symbols:
+            data[("BAD", "Close")] = float("nan")
+        return data
+
+    with patch("app.services.market_data.yahoo_finance.yf.download", side_effect=fake_download) as download:
+        results = await provider.fetch_latest_prices(["aapl", "MSFT", "GOOGL", "BAD"], fallback=False)
+
+    assert download.call_count == 2
+    assert {symbol: results[symbol]["price"] for symbol in ("AAPL", "MSFT", "GOOGL")} == {
+        "AAPL": 10.0,
+        "MSFT": 10.0,
+        "GOOGL": 10.0,
+    }
+    assert isinstance(results["BAD"], LookupError)
+
+
+@pytest.mark.asyncio
+async def test_yahoo_race_returns_first_valid_price(monkeypatch):
+    """Test that race mode returns the fastest valid approach and remembers it"""
+    monkeypatch.setattr("app.services.market_data.yahoo_finance.settings.yahoo_fetch_mode", "race")
+    provider = YahooFinanceProvider()
+    tickers = set()
+
+    def slow(ticker, symbol):
+        tickers.add(id(ticker))
+        time.sleep(0.5)
+        return {"symbol": symbol, "price": 1.0}
+
+    def fast(ticker, symbol):
+        tickers.add(id(ticker))
+        time.sleep(0.05)
+        return {"symbol": symbol, "price": 2.0}
+
+    def empty(ticker, symbol):
+        tickers.add(id(ticker))
+        return None
+
+    slow.__name__, fast.__name__, empty.__name__ = "_try_fast_info", "_try_regular_info", "_try_history_method"
+    provider._try_fast_info, provider._try_regular_info, provider._try_history_method = slow, fast, empty
+
+    started = time.monotonic()
+    result = await provider.get_latest_price("AAPL")
+
+    assert result["price"] == 2.0
+    assert time.monotonic() - started < 0.4
+    assert len(tickers) == 1  # one Ticker shared by all approaches
+    assert provider.winners == {"AAPL": "_try_regular_info"}
+    assert provider._ordered_approaches("AAPL")[0] is fast
+    await provider.aclose()
@@ -1,11 +1,13 @@
 import pytest
+from datetime import datetime
 from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy import delete, select
 from app.services.price_service import PriceService
-from app.models.price import RawMarketData
+from app.models.price import LatestMovingAverage, LatestPrice, ProcessedPrice, RawMarketData
 
 
 @pytest.mark.asyncio
-async def test_get_latest_price_yahoo_finance(test_db):
+async def test_get_latest_price_yahoo_finance(async_test_db):
     """Test getting latest price from Yahoo Finance"""
     service = PriceService()
 
@@ -25,26 +27,159 @@ async def test_get_latest_price_yahoo_finance(test_db):
         with patch.object(service, "producer") as mock_producer:
             mock_producer.produce_price_event = AsyncMock()
 
-            result = await service.get_latest_price(test_db, "AAPL")
+            result = await service.get_latest_price(async_test_db, "AAPL")
 
             assert result["symbol"] == "AAPL"
             assert result["price"] == 150.25
             assert result["provider"] == "yahoo_finance"
 
             # Verify raw data was stored
-            raw_data = test_db.query(RawMarketData).first()
+            raw_data = (await async_test_db.execute(select(RawMarketData))).scalars().first()
             assert raw_data is not None
             assert raw_data.symbol == "AAPL"
 
 
 @pytest.mark.asyncio
-async def test_create_polling_job(test_db):
+async def test_create_polling_job(async_test_db):
     """Test creating a polling job"""
     service = PriceService()
 
-    result = await service.create_polling_job(test_db, ["AAPL", "MSFT"], 60, "yahoo_finance")
+    result = await service.create_polling_job(async_test_db, ["AAPL", "MSFT"], 60, "yahoo_finance")
 
     assert result["status"] == "accepted"
     assert "job_id" in result
     assert result["config"]["symbols"] == ["AAPL", "MSFT"]
     assert result["config"]["interval"] == 60
+
+
+@pytest.mark.asyncio
+async def test_get_latest_price_served_from_cache(async_test_db):
+    """Test that a fresh cached price skips the provider"""
+    cached = {"symbol": "AAPL", "price": 150.25, "timestamp": "2024-03-20T10:30:00Z", "provider": "finnhub"}
+    cache = MagicMock()
+    cache.get = AsyncMock(return_value=cached)
+    service = PriceService(producer=MagicMock(), cache=cache)
+
+    with patch("app.services.price_service.get_provider") as mock_get_provider:
+        result = await service.get_latest_price(async_test_db, "AAPL", "finnhub", max_age=30)
+
+    assert result == cached
+    cache.get.assert_awaited_once_with("finnhub", "AAPL", 30)
+    mock_get_provider.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_get_latest_prices_batch(async_test_db):
+    """Test batch fetching with a per-symbol error"""
+    producer = MagicMock()
+    producer.produce_price_events = AsyncMock()
+    service = PriceService(producer=producer)
+
+    async def fake_prices(symbols):
+        return {
+            symbol: (
+                Exception("unknown symbol")
+                if symbol == "BAD"
+                else {"symbol": symbol, "price": 100.0, "timestamp": "2024-03-20T10:30:00Z", "provider": "yahoo_finance"}
+            )
+            for symbol in symbols
+        }
+
+    mock_provider = MagicMock()
+    mock_provider.fetch_latest_prices = AsyncMock(side_effect=fake_prices)
+
+    with patch("app.services.price_service.get_provider", return_value=mock_provider):
+        result = await service.get_latest_prices(async_test_db, ["aapl", "MSFT", "BAD", "AAPL"], "yahoo_finance")
+
+    assert [p["symbol"] for p in result["prices"]] == ["AAPL", "MSFT"]
+    assert result["errors"] == [{"symbol": "BAD", "detail": "unknown symbol"}]
+    mock_provider.fetch_latest_prices.assert_awaited_once_with(["AAPL", "MSFT", "BAD"])
+
+    events = producer.produce_price_events.call_args[0][0]
+    assert len(events) == 2
+    assert all(event["raw_response_id"] for event in events)
+
+
+@pytest.mark.asyncio
+async def test_latest_reads_use_latest_tables(async_test_db):
+    """Test primary-key reads of the latest tables, with a fallback to history"""
+    await async_test_db.execute(delete(LatestPrice))
+    await async_test_db.execute(delete(ProcessedPrice))
+    async_test_db.add(ProcessedPrice(symbol="MSFT", price=400.0, timestamp=datetime(2024, 3, 20, 10, 0), provider="finnhub"))
+    async_test_db.add(LatestPrice(symbol="AAPL", price=150.25, timestamp=datetime(2024, 3, 20, 10, 30), provider="finnhub"))
+    await async_test_db.commit()
+
+    service = PriceService(producer=MagicMock())
+
+    assert (await service.get_latest_processed_price(async_test_db, "aapl"))["price"] == 150.25
+    assert (await service.get_latest_processed_price(async_test_db, "MSFT"))["price"] == 400.0
+    assert await service.get_latest_processed_price(async_test_db, "TSLA") is None
+
+
+@pytest.mark.asyncio
+async def test_moving_average_on_demand(async_test_db):
+    """Test that windows without precomputed rows are calculated from processed prices"""
+    await async_test_db.execute(delete(ProcessedPrice))
+    for minute, price in enumerate([10.0, 20.0, 30.0]):
+        async_test_db.add(
+            ProcessedPrice(symbol="NVDA", price=price, timestamp=datetime(2024, 3, 20, 10, minute), provider="finnhub")
+        )
+    await async_test_db.commit()
+
+    service = PriceService(producer=MagicMock())
+
+    sma = await service.get_moving_average(async_test_db, "NVDA", 2)
+    assert (sma["kind"], sma["value"], sma["timestamp"]) == ("sma", 25.0, "2024-03-20T10:02:00Z")
+
+    ema = await service.get_moving_average(async_test_db, "NVDA", 3, kind="ema")
+    assert ema["value"] == pytest.approx(22.5)  # 10 -> 15 -> 22.5 with alpha 0.5
+
+
+@pytest.mark.asyncio
+async def test_price_history_buckets(async_test_db):
+    """Test that processed prices are aggregated into OHLC bars per bucket"""
+    await async_test_db.execute(delete(ProcessedPrice))
+    ticks = [(0, 10, 10.0), (1, 30, 12.0), (3, 0, 9.0), (4, 59, 11.0), (5, 0, 20.0), (12, 0, 99.0)]
+    for minute, second, price in ticks:
+        async_test_db.add(
+            ProcessedPrice(symbol="AMD", price=price, timestamp=datetime(2024, 3, 20, 10, minute, second), provider="finnhub")
+        )
+    await async_test_db.commit()
+
+    service = PriceService(producer=MagicMock())
+    history = await service.get_price_history(
+        async_test_db, "amd", datetime(2024, 3, 20, 10, 0), datetime(2024, 3, 20, 10, 10), bucket="5m"
+    )
+
+    assert history["timestamps"] == ["2024-03-20T10:00:00Z", "2024-03-20T10:05:00Z"]
+    assert history["open"] == [10.0, 20.0]
+    assert history["high"] == [12.0, 20.0]
+    assert history["low"] == [9.0, 20.0]
+    assert history["close"] == [11.0, 20.0]
+    assert history["count"] == [4, 1]
+
+    with pytest.raises(ValueError):
+        await service.get_price_history(async_test_db, "AMD", datetime(2024, 1, 1), datetime(2024, 3, 1), bucket="1m")
+
+
+@pytest.mark.asyncio
+async def test_moving_average_ignores_rows_of_windows_no_longer_precomputed(async_test_db):
+    """Test that stored values of a window removed from the configuration are not served"""
+    await async_test_db.execute(delete(ProcessedPrice))
+    await async_test_db.execute(delete(LatestMovingAverage))
+    for minute, price in enumerate([10.0, 20.0, 30.0]):
+        async_test_db.add(
+            ProcessedPrice(symbol="INTC", price=price, timestamp=datetime(2024, 3, 20, 10, minute), provider="finnhub")
+        )
+    async_test_db.add(
+        LatestMovingAverage(symbol="INTC", kind="sma", window_size=3, value=99.0, timestamp=datetime(2024, 3, 1))
+    )
+    async_test_db.add(
+        LatestMovingAverage(symbol="INTC", kind="sma", window_size=5, value=42.0, timestamp=datetime(2024, 3, 20, 10, 2))
+    )
+    await async_test_db.commit()
+
+    service = PriceService(producer=MagicMock())
+
+    assert (await service.get_moving_average(async_test_db, "INTC", 3))["value"] == 20.0  # computed, not the stale row
+    assert (await service.get_moving_average(async_test_db, "INTC", 5))["value"] == 42.0  # precomputed window
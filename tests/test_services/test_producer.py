@@ -0,0 +1,69 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+from confluent_kafka import KafkaException
+from pydantic import ValidationError
+
+from app.core.config import Settings
+from app.services.kafka.producer import PriceEventProducer
+from app.services.kafka.serialization import decode_price_event
+
+PRICE = {"symbol": "AAPL", "price": 150.25, "timestamp": "2024-03-20T10:30:00Z", "provider": "finnhub"}
+
+
+@pytest.fixture
+def producer():
+    with patch("app.services.kafka.producer.Producer") as client_class:
+        client = client_class.return_value
+        client.poll.side_effect = lambda timeout: None
+        client.flush.return_value = 0
+        producer = PriceEventProducer()
+        yield producer
+        producer.close()
+
+
+@pytest.mark.asyncio
+async def test_delivery_futures_resolve_from_callbacks(producer):
+    """Test that delivery reports resolve the futures returned to callers"""
+    futures = await producer.produce_price_events([PRICE, PRICE])
+    callbacks = [call.kwargs["callback"] for call in producer.producer.produce.call_args_list]
+
+    msg = MagicMock()
+    callbacks[0](None, msg)
+    callbacks[1]("broker down", None)
+
+    assert await futures[0] is msg
+    with pytest.raises(KafkaException):
+        await futures[1]
+    assert (producer.delivered, producer.failed) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_full_queue_waits_for_room(producer, monkeypatch):
+    """Test that BufferError is retried until the backpressure timeout"""
+    producer.producer.produce.side_effect = [BufferError("queue full"), BufferError("queue full"), None]
+    future = await producer.produce_price_event(PRICE)
+    assert isinstance(future, asyncio.Future)
+    assert producer.producer.produce.call_count == 3
+
+    monkeypatch.setattr("app.services.kafka.producer.settings.kafka_producer_backpressure_timeout", 0.01)
+    producer.producer.produce.side_effect = BufferError("queue full")
+    with pytest.raises(BufferError):
+        await producer.produce_price_event(PRICE)
+
+
+def test_unknown_event_encoding_is_rejected_at_startup():
+    """Test that an invalid KAFKA_EVENT_ENCODING fails settings validation instead of each produce"""
+    with pytest.raises(ValidationError):
+        Settings(kafka_event_encoding="xml")
+
+
+@pytest.mark.asyncio
+async def test_missing_raw_response_id_is_sent_empty(producer):
+    """Test that a price without a raw row id is not sent as the string "None\" """
+    await producer.produce_price_events([{**PRICE, "raw_response_id": None}])
+    call = producer.producer.produce.call_args
+
+    event = decode_price_event(call.kwargs["value"], call.kwargs["headers"])
+    assert event["raw_response_id"] is None
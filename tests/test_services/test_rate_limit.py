@@ -0,0 +1,25 @@
+import pytest
+
+from app.services.market_data.rate_limit import RateLimitExceeded, TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_burst_then_queue():
+    """Test that callers queue for tokens once the burst is used"""
+    bucket = TokenBucket(rate_per_minute=600, burst=2)  # 10 tokens per second
+
+    assert bucket._reserve(None) == 0
+    assert bucket._reserve(None) == 0
+    assert bucket._reserve(None) == pytest.approx(0.1, abs=0.01)
+    assert bucket._reserve(None) == pytest.approx(0.2, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_deadline():
+    """Test that a wait longer than the timeout fails without taking a token"""
+    bucket = TokenBucket(rate_per_minute=60, burst=1)
+    await bucket.acquire(timeout=0)
+
+    with pytest.raises(RateLimitExceeded):
+        await bucket.acquire(timeout=0.5)
+    assert bucket.tokens == pytest.approx(0, abs=0.01)
@@ -0,0 +1,115 @@
+import json
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from app.models.price import PollingJob, SchedulerInstance
+from app.services.scheduler import PollingScheduler
+
+
+@pytest.mark.asyncio
+async def test_overlapping_jobs_fetch_each_symbol_once(async_test_sessionmaker):
+    """Test that due jobs are merged into one fetch per (provider, symbol)"""
+    async with async_test_sessionmaker() as db:
+        await db.execute(delete(PollingJob))
+        await db.execute(delete(SchedulerInstance))
+        db.add_all(
+            [
+                PollingJob(job_id="poll_a", symbols=json.dumps(["AAPL", "MSFT"]), interval=60, provider="finnhub"),
+                PollingJob(job_id="poll_b", symbols=json.dumps(["msft", "GOOGL"]), interval=120, provider="finnhub"),
+                PollingJob(job_id="poll_c", symbols=json.dumps(["AAPL"]), interval=60, provider="finnhub", status="paused"),
+            ]
+        )
+        await db.commit()
+
+    price_service = MagicMock()
+    price_service.get_latest_prices = AsyncMock(return_value={"prices": [], "errors": []})
+    scheduler = PollingScheduler(price_service, session_factory=async_test_sessionmaker)
+
+    await scheduler.load_jobs()
+    assert set(scheduler.jobs) == {"poll_a", "poll_b"}
+
+    assert await scheduler.run_due() == 3
+    price_service.get_latest_prices.assert_awaited_once()
+    assert price_service.get_latest_prices.call_args[0][1:3] == (["AAPL", "GOOGL", "MSFT"], "finnhub")
+
+    # Nothing is due again until the next interval
+    assert await scheduler.run_due() == 0
+
+    async with async_test_sessionmaker() as db:
+        jobs = (await db.execute(select(PollingJob).where(PollingJob.job_id.in_(["poll_a", "poll_b"])))).scalars().all()
+        assert all(job.last_run is not None and job.status == "active" for job in jobs)
+
+
+@pytest.mark.asyncio
+async def test_jobs_are_leased_across_instances(async_test_sessionmaker):
+    """Test that instances split jobs and take over jobs of a stopped instance"""
+    async with async_test_sessionmaker() as db:
+        await db.execute(delete(PollingJob))
+        await db.execute(delete(SchedulerInstance))
+        db.add_all(
+            [PollingJob(job_id=f"poll_{i}", symbols=json.dumps(["AAPL"]), interval=60, provider="finnhub") for i in range(4)]
+        )
+        await db.commit()
+
+    first = PollingScheduler(MagicMock(), session_factory=async_test_sessionmaker, instance_id="first")
+    second = PollingScheduler(MagicMock(), session_factory=async_test_sessionmaker, instance_id="second")
+
+    await first.load_jobs()
+    assert len(first.jobs) == 4
+
+    # A new instance heartbeats, the first one releases half, the second claims them
+    await second.load_jobs()
+    await first.load_jobs()
+    await second.load_jobs()
+    assert len(first.jobs) == 2 and len(second.jobs) == 2
+    assert not set(first.jobs) & set(second.jobs)
+
+    await first.release_leases()
+    await second.load_jobs()
+    assert len(second.jobs) == 4
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_a_dead_instance_move_once_its_leases_expire(async_test_sessionmaker):
+    """Test that a dead instance holds its share until lease_ttl after its last renewal, and no longer"""
+    async with async_test_sessionmaker() as db:
+        await db.execute(delete(PollingJob))
+        await db.execute(delete(SchedulerInstance))
+        db.add_all(
+            [PollingJob(job_id=f"poll_{i}", symbols=json.dumps(["AAPL"]), interval=60, provider="finnhub") for i in range(4)]
+        )
+        await db.commit()
+
+    dead = PollingScheduler(MagicMock(), session_factory=async_test_sessionmaker, instance_id="dead", lease_ttl=30)
+    survivor = PollingScheduler(MagicMock(), session_factory=async_test_sessionmaker, instance_id="survivor", lease_ttl=30)
+    await dead.load_jobs()
+    await survivor.load_jobs()
+    await dead.load_jobs()
+    await survivor.load_jobs()
+    assert len(survivor.jobs) == 2
+
+    async def last_renewed(seconds_ago: float) -> None:
+        renewed = datetime.utcnow() - timedelta(seconds=seconds_ago)
+        async with async_test_sessionmaker() as db:
+            await db.execute(
+                update(SchedulerInstance).where(SchedulerInstance.instance_id == "dead").values(heartbeat_at=renewed)
+            )
+            await db.execute(
+                update(PollingJob)
+                .where(PollingJob.lease_owner == "dead")
+                .values(lease_expires_at=renewed + timedelta(seconds=30))
+            )
+            await db.commit()
+
+    # Within the TTL the dead instance still counts, and its leases are live
+    await last_renewed(25)
+    await survivor.load_jobs()
+    assert len(survivor.jobs) == 2
+
+    # The first refresh after the TTL takes over all of its jobs
+    await last_renewed(31)
+    await survivor.load_jobs()
+    assert len(survivor.jobs) == 4
@@ -0,0 +1,66 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.services.kafka.serialization import BINARY, JSON, decode_price_event, encode_price_event
+
+MESSAGE = {
+    "symbol": "AAPL",
+    "price": 150.25,
+    "timestamp": "2024-03-20T10:30:00.123456Z",
+    "source": "finnhub",
+    "raw_response_id": str(uuid.uuid4()),
+}
+
+
+@pytest.mark.parametrize("encoding", [JSON, BINARY])
+def test_price_event_round_trip(encoding):
+    """Test that both wire formats decode to the same event"""
+    value, headers = encode_price_event(MESSAGE, encoding)
+    event = decode_price_event(value, headers)
+
+    assert event == {
+        "symbol": "AAPL",
+        "price": 150.25,
+        "timestamp": datetime(2024, 3, 20, 10, 30, 0, 123456),
+        "source": "finnhub",
+        "raw_response_id": MESSAGE["raw_response_id"],
+    }
+
+
+@pytest.mark.parametrize("encoding", [JSON, BINARY])
+def test_offset_timestamps_decode_as_naive_utc(encoding):
+    """Test that a timestamp with a UTC offset decodes to the same instant in naive UTC"""
+    value, headers = encode_price_event({**MESSAGE, "timestamp": "2024-03-20T12:30:00.123456+02:00"}, encoding)
+
+    assert decode_price_event(value, headers)["timestamp"] == datetime(2024, 3, 20, 10, 30, 0, 123456)
+
+
+def test_binary_is_compact_and_headerless_messages_are_json():
+    """Test the binary size, JSON as the default and rejection of bad payloads"""
+    binary, _ = encode_price_event(MESSAGE, BINARY)
+    json_value, _ = encode_price_event(MESSAGE, JSON)
+    assert len(binary) < len(json_value) / 2
+
+    # Messages from producers that predate the header are JSON
+    assert decode_price_event(json_value, None)["symbol"] == "AAPL"
+
+    with pytest.raises(ValueError):
+        decode_price_event(binary[:-1], [("encoding", b"binary")])
+    with pytest.raises(ValueError):
+        decode_price_event(b"\x09" + binary[1:], [("encoding", b"binary")])
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [("timestamp", 1710930600), ("price", "abc"), ("price", None), ("symbol", ["AAPL"]), ("raw_response_id", 7)],
+)
+def test_json_fields_of_the_wrong_type_raise_value_error(field, value):
+    """Test that malformed JSON fields are rejected with ValueError"""
+    message = dict(MESSAGE, **{field: value})
+    with pytest.raises(ValueError):
+        decode_price_event(json.dumps(message).encode("utf-8"), None)
+    with pytest.raises(ValueError):
+        decode_price_event(b"[1, 2]", None)
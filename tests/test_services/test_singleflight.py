@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight, SingleFlightOverloaded
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_flight():
+    """Test that concurrent callers of the same key share one call"""
+    flights = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"price": 150.25}
+
+    results = await asyncio.gather(*(flights.do("AAPL", fetch) for _ in range(10)))
+
+    assert calls == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert all(result == {"price": 150.25} for result, _ in results)
+    assert flights.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_waiter_limit_and_timeout():
+    """Test per-key waiter limits and waiter timeouts"""
+    flights = SingleFlight(max_waiters=1, timeout=0.01)
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return 1
+
+    leader = asyncio.ensure_future(flights.do("AAPL", fetch))
+    await asyncio.sleep(0)
+
+    waiter = asyncio.ensure_future(flights.do("AAPL", fetch))
+    await asyncio.sleep(0)
+    with pytest.raises(SingleFlightOverloaded):
+        await flights.do("AAPL", fetch)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await waiter
+
+    release.set()
+    assert await leader == (1, False)
+
+
+@pytest.mark.asyncio
+async def test_bulk_call_joins_keys_in_flight():
+    """Test that do_many fetches only keys not in flight, in one call"""
+    flights = SingleFlight()
+    release = asyncio.Event()
+    bulk_calls = []
+
+    async def fetch_one():
+        await release.wait()
+        return "single"
+
+    async def fetch_bulk(keys):
+        bulk_calls.append(keys)
+        await release.wait()
+        return {key: f"bulk-{key}" for key in keys if key != "MISSING"}
+
+    single = asyncio.ensure_future(flights.do("AAPL", fetch_one))
+    await asyncio.sleep(0)
+    bulk = asyncio.ensure_future(flights.do_many(["AAPL", "MSFT", "MISSING"], fetch_bulk))
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await bulk
+    assert bulk_calls == [["MSFT", "MISSING"]]
+    assert results[:2] == [("single", True), ("bulk-MSFT", False)]
+    assert isinstance(results[2], KeyError)
+    assert await single == ("single", False)
+    assert flights.in_flight() == 0
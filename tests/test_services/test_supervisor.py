@@ -0,0 +1,109 @@
+from unittest.mock import patch
+
+from app.services.kafka.supervisor import ConsumerSupervisor
+
+
+class FakeProcess:
+    def __init__(self, target, args, name, stubborn=False):
+        self.name = name
+        self.pid = 1000 + args[0]
+        self.exitcode = None
+        self.alive = False
+        self.stubborn = stubborn
+        self.terminated = self.killed = self.joined = False
+
+    def start(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def crash(self):
+        self.alive, self.exitcode = False, 1
+
+    def terminate(self):
+        self.terminated = True
+        if not self.stubborn:
+            self.alive, self.exitcode = False, 0
+
+    def kill(self):
+        self.killed = True
+        self.alive, self.exitcode = False, -9
+
+    def join(self, timeout=None):
+        self.joined = True
+
+    def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, stubborn=()):
+        self.stubborn = set(stubborn)
+        self.started = []
+
+    def Process(self, target, args, name):
+        process = FakeProcess(target, args, name, stubborn=args[0] in self.stubborn)
+        self.started.append(process)
+        return process
+
+
+def test_crashed_worker_is_restarted_with_backoff():
+    """Test that a worker that keeps crashing is restarted after 1, 2 and 4 seconds"""
+    supervisor = ConsumerSupervisor(1, restart_delay=1.0, max_restart_delay=8.0)
+    supervisor.context = FakeContext()
+
+    with patch("app.services.kafka.supervisor.time.monotonic") as clock:
+        clock.return_value = 100.0
+        supervisor._start(0)
+
+        for delay in (1.0, 2.0, 4.0):
+            started = len(supervisor.context.started)
+            supervisor.context.started[-1].crash()
+            crashed_at = clock.return_value
+
+            supervisor._check(0)
+            clock.return_value = crashed_at + delay - 0.1
+            supervisor._check(0)
+            assert len(supervisor.context.started) == started
+
+            clock.return_value = crashed_at + delay
+            supervisor._check(0)
+            assert len(supervisor.context.started) == started + 1
+            assert supervisor.context.started[-1].is_alive()
+
+
+def test_backoff_resets_after_a_healthy_run():
+    """Test that a worker that stayed up long enough is restarted after the initial delay again"""
+    supervisor = ConsumerSupervisor(1, restart_delay=1.0, max_restart_delay=8.0)
+    supervisor.context = FakeContext()
+    supervisor.delays[0] = 8.0  # after several quick crashes
+
+    with patch("app.services.kafka.supervisor.time.monotonic") as clock:
+        clock.return_value = 100.0
+        supervisor._start(0)
+
+        clock.return_value = 200.0  # up for longer than twice the maximum delay
+        supervisor.context.started[-1].crash()
+        supervisor._check(0)
+
+        clock.return_value = 201.0
+        supervisor._check(0)
+        assert len(supervisor.context.started) == 2
+        assert supervisor.delays[0] == 2.0
+
+
+def test_stop_terminates_and_joins_every_worker():
+    """Test that stop() ends run() with every worker terminated and joined, killing any that hang"""
+    supervisor = ConsumerSupervisor(3, shutdown_timeout=0.0)
+    supervisor.context = FakeContext(stubborn={2})
+
+    with patch("app.services.kafka.supervisor.signal.signal"), patch(
+        "app.services.kafka.supervisor.time.sleep", side_effect=lambda _: supervisor.stop()
+    ):
+        supervisor.run()
+
+    workers = supervisor.context.started
+    assert len(workers) == 3
+    assert all(worker.terminated and worker.joined and not worker.is_alive() for worker in workers)
+    assert [worker.killed for worker in workers] == [False, False, True]
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app.models.price import RawMarketData
+from app.services.write_behind import RawDataWriter
+
+
+def make_rows(count: int):
+    return [
+        {
+            "id": uuid.uuid4(),
+            "symbol": "AAPL",
+            "provider": "finnhub",
+            "raw_response": json.dumps({"c": 150.25}),
+            "timestamp": datetime.utcnow(),
+        }
+        for _ in range(count)
+    ]
+
+
+async def count_rows(session_factory) -> int:
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(RawMarketData))
+
+
+@pytest.mark.asyncio
+async def test_rows_are_written_in_batches_and_on_close(async_test_sessionmaker):
+    """Test that full batches are written in the background and the rest on close"""
+    async with async_test_sessionmaker() as db:
+        await db.execute(delete(RawMarketData))
+        await db.commit()
+
+    writer = RawDataWriter(session_factory=async_test_sessionmaker, batch_size=3, flush_interval=60, max_pending=10)
+    writer.start()
+
+    await writer.add(make_rows(4))
+    for _ in range(50):
+        if writer.written:
+            break
+        await asyncio.sleep(0.01)
+
+    # One full batch went out without waiting for the interval
+    assert writer.written == 3
+    assert await count_rows(async_test_sessionmaker) == 3
+
+    await writer.close()
+    assert writer.written == 4
+    assert await count_rows(async_test_sessionmaker) == 4